@@ -1 +1,3 @@
-from .__main__ import run
\ No newline at end of file
+from .__main__ import run, detect, detect_boxes
+from .async_detector import AsyncDetector
+from .detector import Detector, DetectorConfig
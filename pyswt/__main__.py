@@ -6,22 +6,26 @@ from . import swt
 from . import connected_component
 from . import filter_connected_components
 from . import letter_chains
+from .detector import Detector, get_boxes
 
-def run(img):
+__default_detector = Detector()
+
+def run(img, text_mask=None):
     """Main SWT runner function.
     Applies the SWT algorithm steps and outputs bounding boxes.
 
     Keyword Arguments:
   
     img -- the image to apply SWT on
+    text_mask -- optional boolean image limiting where rays are cast, see prefilter.py
     """
 
     # Converting image to grayscale
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
     # Applying SWT to image, once for light text, once for dark text
-    swt_light = swt.run(gray, 1)
-    swt_dark = swt.run(gray, -1)
+    swt_light = swt.run(gray, 1, text_mask)
+    swt_dark = swt.run(gray, -1, text_mask)
     swt_light_dark = [swt_light, swt_dark]
 
     # Get connected component image and data. connected_component_data is defined in connected_component.py
@@ -39,7 +43,7 @@ def run(img):
 
     # return connected_component.get_connected_component_image(connected_component_data_light, img.shape[0], img.shape[1])
     cc_drawn_boxes = connected_component.make_image_with_bounding_boxes(img, aggregate_cc_light)
-    cc_drawn_boxes = connected_component.make_image_with_bounding_boxes(cc_drawn_boxes, aggregate_cc_dark, (255, 0, 0))
+    cc_drawn_boxes = connected_component.make_image_with_bounding_boxes(cc_drawn_boxes, aggregate_cc_dark, (255, 0, 0), True)
     # apply single connected component filters to remove noise
     filtered_components_light = filter_connected_components.run(connected_component_data_light)
     filtered_components_dark = filter_connected_components.run(connected_component_data_dark)
@@ -53,7 +57,7 @@ def run(img):
         aggregate_cc_light.append(cc)
 
     cc_filt_drawn_boxes = connected_component.make_image_with_bounding_boxes(img, aggregate_cc_light)
-    cc_filt_drawn_boxes = connected_component.make_image_with_bounding_boxes(cc_filt_drawn_boxes, aggregate_cc_dark, (255, 0, 0))
+    cc_filt_drawn_boxes = connected_component.make_image_with_bounding_boxes(cc_filt_drawn_boxes, aggregate_cc_dark, (255, 0, 0), True)
 
     # Chains contain the final bounding boxes. Filter based on chain properties
     chains_light = letter_chains.run(filtered_components_light)
@@ -70,6 +74,32 @@ def run(img):
     """
 
     image_with_bounding_boxes = letter_chains.make_image_with_bounding_boxes(img, chains_light)
-    image_with_bounding_boxes = letter_chains.make_image_with_bounding_boxes(image_with_bounding_boxes, chains_dark, (255, 0, 0))
+    image_with_bounding_boxes = letter_chains.make_image_with_bounding_boxes(image_with_bounding_boxes, chains_dark, (255, 0, 0), True)
 
     return image_with_bounding_boxes, swt_light_dark, cc_light_dark, cc_drawn_boxes, cc_filt_drawn_boxes
+
+
+def detect(img, text_mask=None):
+    """Runs the SWT pipeline and returns only the letter chains.
+    Unlike run(), no intermediate or debug images are built.
+    Uses a Detector with the default configuration, see detector.py.
+
+    Keyword Arguments:
+
+    img -- the image to apply SWT on
+    text_mask -- optional boolean image limiting where rays are cast, see prefilter.py
+    """
+    return __default_detector.detect(img, text_mask)
+
+
+def detect_boxes(img, text_mask=None):
+    """Runs detect() and returns the boxes as a compact array.
+    Each row is [row_min, col_min, row_max, col_max, gradient_direction],
+    with gradient direction 1 for light text and -1 for dark text.
+
+    Keyword Arguments:
+
+    img -- the image to apply SWT on
+    text_mask -- optional boolean image limiting where rays are cast, see prefilter.py
+    """
+    return get_boxes(detect(img, text_mask))
@@ -0,0 +1,137 @@
+import time
+
+import cv2
+import numpy as np
+
+from . import cast_ray as cr
+from . import connected_component
+from . import filter_connected_components
+from . import letter_chains
+from . import prefilter
+from . import swt
+from .detector import DetectorConfig, get_boxes, use_config_backend
+
+# Candidate caps bounding the super-linear stages
+__default_config = DetectorConfig(max_components=1000, max_pairs=10000)
+
+# Fraction of each polarity's share of the budget ray casting may use, the rest is left for the later stages
+__cast_fraction = 0.5
+
+
+def detect(img, budget, tile_size=32, config=__default_config, cast_fraction=__cast_fraction):
+    """Deadline-bounded version of pyswt.detect.
+    Edge detection and tile scoring come out of the budget first. The time left is
+    shared by the two polarities, light text first. Within each share, rays are cast
+    tile by tile, most text-like tiles first, for up to cast_fraction of the share,
+    and components are grown until the share runs out. Whatever was found by then is
+    chained and returned, with the result marked as partial.
+    At least the most text-like tile is always cast, even if setup used up the budget.
+    Chaining is not interrupted, the candidate caps of the config keep the time it takes bounded.
+    The memory limit and prefilter of the config are not used, anytime detection does not tile
+    and already casts the tiles in prefilter order.
+    The first call with a compiled backend also loads its kernels, which the budget
+    cannot account for.
+
+    Keyword Arguments:
+
+    img -- the image to apply SWT on
+    budget -- time budget in seconds
+    tile_size -- size of the tiles rays are cast in
+    config -- the DetectorConfig to detect with, set its max_components and max_pairs to bound chaining
+    cast_fraction -- fraction of each polarity's share of the budget ray casting may use
+    """
+    start = time.monotonic()
+    deadline = start + budget
+
+    result = AnytimeResult()
+    with use_config_backend(config):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        edges, gx, gy = swt.get_edges_and_gradients(gray)
+
+        # Ray origins grouped by tile, in tile priority order
+        origin_rows, origin_cols = np.nonzero(edges)
+        tiles = get_tile_batches(edges, gx, gy, origin_rows, origin_cols, tile_size)
+        result.origins_total = 2 * len(origin_rows)
+        result.setup_time = time.monotonic() - start
+
+        directions = [1, -1]
+        for k, gradient_direction in enumerate(directions):
+            now = time.monotonic()
+            if k > 0 and now >= deadline:
+                result.partial = True
+                break
+
+            # The time left is shared equally by the polarities still to run
+            polarity_deadline = now + max(deadline - now, 0) / (len(directions) - k)
+            cast_deadline = now + (polarity_deadline - now) * cast_fraction
+            rays_list = []
+            for tile_origins in tiles:
+                if len(rays_list) > 0 and time.monotonic() >= cast_deadline:
+                    result.partial = True
+                    break
+                rays_list.append(swt.cast_rays(gx, gy, edges, origin_rows[tile_origins], origin_cols[tile_origins],
+                                               gradient_direction))
+                result.origins_cast += len(tile_origins)
+
+            rays = sort_by_origin(cr.concatenate_rays(rays_list), gray.shape[1])
+            stroke_widths = swt.sparse_from_rays(gray.shape, rays)
+
+            connected_component_data = connected_component.iter_sparse(gray, stroke_widths,
+                                                                       deadline=polarity_deadline)
+            filtered_components = filter_connected_components.run(connected_component_data,
+                                                                  config.max_components, config.filters)
+            if time.monotonic() >= polarity_deadline:
+                # Growing components was cut short
+                result.partial = True
+            result.chains_light_dark[k] = letter_chains.run(filtered_components, config.max_pairs, config.chains)
+
+    result.elapsed = time.monotonic() - start
+    return result
+
+
+def get_tile_batches(edges, gx, gy, origin_rows, origin_cols, tile_size):
+    """Returns index arrays into the origins, one per tile, tiles passing the prefilter first.
+    Within each group, tiles with a higher edge density come first.
+    """
+    scores = prefilter.run_on_gradients(edges, gx, gy, tile_size)
+    num_tile_cols = scores.tile_mask.shape[1]
+
+    # Passing tiles sort ahead of all others
+    priority = scores.edge_density + scores.tile_mask
+    tile_order = np.argsort(-priority.ravel(), kind="stable")
+    tile_rank = np.empty_like(tile_order)
+    tile_rank[tile_order] = np.arange(len(tile_order))
+
+    origin_tiles = (origin_rows // tile_size) * num_tile_cols + origin_cols // tile_size
+    origin_ranks = tile_rank[origin_tiles]
+    order = np.argsort(origin_ranks, kind="stable")
+    boundaries = np.nonzero(np.diff(origin_ranks[order]))[0] + 1
+    return np.split(order, boundaries) if len(order) > 0 else []
+
+
+def sort_by_origin(rays, num_cols):
+    """Puts rays back in row-major order of their origins, the order swt.run casts them in.
+    Ray medians are applied in this order, so results match an uninterrupted run.
+    """
+    first = rays.offsets[:-1]
+    keys = rays.rows[first] * num_cols + rays.cols[first]
+    return rays.take(np.argsort(keys, kind="stable"))
+
+
+class AnytimeResult:
+    """Result of a deadline-bounded detection"""
+    def __init__(self):
+        # Chains found for light and dark text, empty if a polarity was not reached
+        self.chains_light_dark = [[], []]
+        # True if the deadline cut detection short
+        self.partial = False
+        self.elapsed = 0
+        # Seconds spent on edge detection and tile scoring before any ray was cast
+        self.setup_time = 0
+
+        # Number of ray origins cast from, out of the total for both polarities
+        self.origins_cast = 0
+        self.origins_total = 0
+
+    def get_boxes(self):
+        return get_boxes(self.chains_light_dark)
@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .__main__ import detect
+
+
+class AsyncDetector:
+    """Asyncio front-end for the blocking SWT pipeline.
+    Detection is offloaded to an executor so the event loop is never stalled.
+
+    Keyword Arguments:
+
+    detect_func -- blocking callable taking an image, defaults to pyswt.detect
+    executor -- concurrent.futures executor to run detections on. If None, a
+                thread pool owned by this detector is created
+    max_concurrency -- maximum number of detections running at once
+    timeout -- default per-request timeout in seconds, None waits forever
+    coalesce -- share a single detection between identical images requested concurrently
+    """
+    def __init__(self, detect_func=None, executor=None, max_concurrency=None, timeout=None, coalesce=True):
+        if max_concurrency is None:
+            max_concurrency = os.cpu_count() or 1
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        self.detect_func = detect if detect_func is None else detect_func
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.coalesce = coalesce
+
+        self.__owns_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="pyswt")
+        self.__executor = executor
+
+        # Created lazily so the semaphore belongs to the loop that uses it
+        self.__semaphore = None
+
+        # Coalescing key -> [task, number of callers waiting on it]
+        self.__pending = {}
+
+    async def detect(self, img, timeout=None):
+        """Detects text in img without blocking the event loop.
+
+        Keyword Arguments:
+
+        img -- the image to apply SWT on
+        timeout -- seconds to wait for this request, overrides the default timeout
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        if not self.coalesce:
+            return await asyncio.wait_for(self.__run(img), timeout)
+
+        # Hashing a large frame takes milliseconds, so it is kept off the event loop too
+        key = await asyncio.get_running_loop().run_in_executor(None, image_key, img)
+        entry = self.__pending.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(self.__run(img))
+            entry = [task, 0]
+            self.__pending[key] = entry
+            task.add_done_callback(lambda t: self.__forget(key, t))
+        task = entry[0]
+        entry[1] += 1
+
+        try:
+            # Shielding keeps one caller's cancellation or timeout from
+            # cancelling the detection for everyone else waiting on it
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        finally:
+            entry[1] -= 1
+            # Nobody is interested in the result anymore. The entry is dropped right away,
+            # as the task only finishes cancelling later, and new requests must not join it.
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+                if self.__pending.get(key) is entry:
+                    del self.__pending[key]
+
+    async def __run(self, img):
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self.__semaphore:
+            loop = asyncio.get_running_loop()
+            # Cancelling this future only stops work that has not started yet,
+            # a detection already running in the executor runs to completion
+            return await loop.run_in_executor(self.__executor, self.detect_func, img)
+
+    def __forget(self, key, task):
+        entry = self.__pending.get(key)
+        if entry is not None and entry[0] is task:
+            del self.__pending[key]
+        # Retrieve the exception so an abandoned task does not log a warning
+        if not task.cancelled():
+            task.exception()
+
+    def close(self, wait=True):
+        """Shuts down the executor if this detector created it"""
+        if self.__owns_executor:
+            self.__executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close(wait=False)
+
+
+def image_key(img):
+    """Returns a key identifying the contents of an image, used for request coalescing"""
+    # Hashing the buffer itself, contiguous images are not copied
+    digest = hashlib.blake2b(memoryview(np.ascontiguousarray(img)).cast("B"), digest_size=16)
+    return img.shape, img.dtype.str, digest.digest()
@@ -0,0 +1,130 @@
+import importlib
+import os
+import threading
+from contextlib import contextmanager
+
+# Kernel name -> {backend name: implementation}
+__kernels = {}
+
+# The reference implementations, always available
+__reference_backend = "python"
+
+# Compiled backends and the module registering their kernels.
+# These are only imported when first asked for, and are skipped if
+# their dependencies are not installed.
+__optional_backends = {
+    "numba": ".numba_kernels"
+}
+__available_optional_backends = None
+
+# None picks the first available optional backend, falling back to python
+__active_backend = os.environ.get("PYSWT_BACKEND") or None
+
+# Backend selected for a single thread by use_backend, overrides __active_backend
+__thread_state = threading.local()
+
+
+def register_kernel(name, backend=__reference_backend):
+    """Decorator registering func as the implementation of a kernel for a backend
+
+    Keyword Arguments:
+
+    name -- the name of the kernel, e.g. "cast_rays"
+    backend -- the backend the implementation belongs to
+    """
+    def decorator(func):
+        __kernels.setdefault(name, {})[backend] = func
+        return func
+    return decorator
+
+
+def available_backends():
+    """Returns the names of the backends that can be used, reference backend first"""
+    global __available_optional_backends
+    if __available_optional_backends is None:
+        available = []
+        for backend, module in __optional_backends.items():
+            try:
+                importlib.import_module(module, __package__)
+                available.append(backend)
+            except ImportError:
+                continue
+        __available_optional_backends = available
+
+    return [__reference_backend] + __available_optional_backends
+
+
+def set_backend(backend):
+    """Selects the backend used for kernels. None selects the fastest available one
+
+    Keyword Arguments:
+
+    backend -- name of the backend, see available_backends()
+    """
+    global __active_backend
+    check_backend(backend)
+    __active_backend = backend
+
+
+@contextmanager
+def use_backend(backend):
+    """Selects the backend for the current thread only, until the with block exits.
+    Other threads keep using their own or the globally selected backend.
+
+    Keyword Arguments:
+
+    backend -- name of the backend, see available_backends(). None selects the fastest available one
+    """
+    check_backend(backend)
+    previous = getattr(__thread_state, "backends", ())
+    __thread_state.backends = previous + (backend,)
+    try:
+        yield
+    finally:
+        __thread_state.backends = previous
+
+
+def check_backend(backend):
+    if backend is not None and backend not in __optional_backends and backend != __reference_backend:
+        raise ValueError("Unknown backend: " + str(backend))
+
+
+def get_backend():
+    """Returns the name of the backend kernels are currently taken from"""
+    backends = getattr(__thread_state, "backends", ())
+    if len(backends) > 0:
+        return resolve_backend(backends[-1])
+    return resolve_backend(__active_backend)
+
+
+def resolve_backend(backend):
+    """Resolves a requested backend name to one that is available"""
+    available = available_backends()
+    if backend is None:
+        return available[-1]
+    if backend in available:
+        return backend
+    # Requested backend is not installed, fall back to the reference implementation
+    return __reference_backend
+
+
+def get_kernel(name, backend=None):
+    """Returns the implementation of a kernel.
+    Falls back to the reference implementation if the backend does not provide the kernel.
+
+    Keyword Arguments:
+
+    name -- the name of the kernel
+    backend -- name of the backend to use, defaults to the selected backend
+    """
+    if backend is None:
+        backend = get_backend()
+    else:
+        backend = resolve_backend(backend)
+
+    implementations = __kernels[name]
+    return implementations.get(backend, implementations[__reference_backend])
+
+
+def get_kernel_names():
+    return list(__kernels.keys())
@@ -0,0 +1,162 @@
+import cv2
+import numpy as np
+
+from . import connected_component
+from . import filter_connected_components
+from . import letter_chains
+from . import swt
+from .detector import DetectorConfig, use_config_backend
+
+# Default size mosaics are filled up to, larger images get a mosaic of their own
+__mosaic_shape = (1024, 1024)
+
+# Pixels of padding around each image, one pixel is enough to keep rays and components apart
+__guard = 1
+
+
+def detect_boxes(imgs, mosaic_shape=__mosaic_shape, guard=__guard, config=DetectorConfig()):
+    """Batch version of pyswt.detect_boxes for many small images.
+    The images are packed into mosaics, separated by guard borders, and the
+    per-call work is done once per mosaic instead of once per image.
+    Returns one box array per image, in image coordinates, the same boxes
+    pyswt.detect_boxes returns for each image.
+
+    Keyword Arguments:
+
+    imgs -- list of BGR images
+    mosaic_shape -- (rows, cols) the mosaics are filled up to
+    guard -- width of the padding around each image, at least 1
+    config -- the DetectorConfig to detect with, its memory limit and prefilter are not used
+    """
+    boxes = [[] for _ in imgs]
+    with use_config_backend(config):
+        for mosaic in pack([img.shape[:2] for img in imgs], mosaic_shape, guard):
+            for index, image_boxes in zip(mosaic.indices, mosaic.detect_boxes(imgs, config)):
+                boxes[index] = image_boxes
+
+    return boxes
+
+
+def pack(shapes, mosaic_shape=__mosaic_shape, guard=__guard):
+    """Places images of the given (rows, cols) shapes into mosaics, in shelves of similar height.
+    Returns the list of Mosaic layouts.
+    """
+    max_rows, max_cols = mosaic_shape
+    mosaics = []
+    mosaic = None
+    shelf_row = shelf_col = shelf_height = 0
+
+    # Tallest first, so each shelf holds images of similar height
+    for index in sorted(range(len(shapes)), key=lambda i: -shapes[i][0]):
+        cell_rows = shapes[index][0] + 2 * guard
+        cell_cols = shapes[index][1] + 2 * guard
+
+        # Starting a new shelf when the image does not fit next to the previous one
+        if mosaic is not None and shelf_col + cell_cols > max_cols:
+            shelf_row += shelf_height
+            shelf_col = shelf_height = 0
+
+        # Starting a new mosaic when the shelf does not fit below the previous ones
+        if mosaic is None or (shelf_row + cell_rows > max_rows and len(mosaic.indices) > 0):
+            mosaic = Mosaic(guard)
+            mosaics.append(mosaic)
+            shelf_row = shelf_col = shelf_height = 0
+
+        mosaic.add(index, shelf_row + guard, shelf_col + guard, shapes[index])
+        shelf_col += cell_cols
+        shelf_height = max(shelf_height, cell_rows)
+
+    return mosaics
+
+
+class Mosaic:
+    """Layout of images packed into one mosaic image"""
+    def __init__(self, guard):
+        self.guard = guard
+        self.indices = []
+        # Top-left corner and shape of each image in the mosaic
+        self.rows = []
+        self.cols = []
+        self.shapes = []
+        self.shape = (0, 0)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def add(self, index, row, col, shape):
+        self.indices.append(index)
+        self.rows.append(row)
+        self.cols.append(col)
+        self.shapes.append(tuple(shape[:2]))
+        self.shape = (max(self.shape[0], row + shape[0] + self.guard), max(self.shape[1], col + shape[1] + self.guard))
+
+    def get_image(self, imgs):
+        """Copies the images of this mosaic into one image, each surrounded by its reflected border"""
+        mosaic_img = np.zeros(self.shape + imgs[self.indices[0]].shape[2:], imgs[self.indices[0]].dtype)
+        for index, tile in zip(self.indices, self.get_tiles(self.guard)):
+            # Reflecting like the gradient filters do at image borders, so gradients inside match
+            mosaic_img[tile] = cv2.copyMakeBorder(imgs[index], *[self.guard] * 4, cv2.BORDER_REFLECT_101)
+        return mosaic_img
+
+    def get_image_ids(self):
+        """Returns the position in this mosaic of the image at each pixel, -1 outside images"""
+        image_ids = np.full(self.shape, -1, np.int64)
+        for k, tile in enumerate(self.get_tiles()):
+            image_ids[tile] = k
+        return image_ids
+
+    def get_tiles(self, border=0):
+        """Returns the slices of each image in the mosaic, grown by border pixels on every side"""
+        return [(slice(row - border, row + num_rows + border), slice(col - border, col + num_cols + border))
+                for row, col, (num_rows, num_cols) in zip(self.rows, self.cols, self.shapes)]
+
+    def get_edges(self, gray, inside):
+        """Returns the Canny edges of each image, computed for the whole mosaic at once"""
+        # Canny takes its derivatives with replicated image borders, the guard is refilled to match
+        gray = gray.copy()
+        for tile, border_tile in zip(self.get_tiles(), self.get_tiles(self.guard)):
+            gray[border_tile] = cv2.copyMakeBorder(gray[tile], *[self.guard] * 4, cv2.BORDER_REPLICATE)
+        dx = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3)
+        dy = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3)
+
+        # Canny sees nothing outside an image, so edges are thinned and linked at image borders as they are alone
+        dx[~inside] = 0
+        dy[~inside] = 0
+        return swt.get_edges_from_derivatives(dx, dy)
+
+    def detect_boxes(self, imgs, config=DetectorConfig()):
+        """Runs detection on this mosaic, returns the boxes of each of its images"""
+        gray = cv2.cvtColor(self.get_image(imgs), cv2.COLOR_BGR2GRAY)
+        image_ids = self.get_image_ids()
+        inside = image_ids >= 0
+
+        # The gradients match a single image run inside the reflected borders
+        _, gx, gy = swt.get_edges_and_gradients(gray)
+        edges = self.get_edges(gray, inside)
+        origin_rows, origin_cols = np.nonzero(edges)
+
+        boxes = [[] for _ in self.indices]
+        for gradient_direction in [1, -1]:
+            # Rays leaving their image are dropped, as they are at the border of a single image
+            rays = swt.cast_rays(gx, gy, edges, origin_rows, origin_cols, gradient_direction, inside)
+            stroke_widths = swt.sparse_from_rays(self.shape, rays)
+
+            # Components cannot cross the guard, each belongs to the image it starts in
+            components = [[] for _ in self.indices]
+            for cc in connected_component.iter_sparse(gray, stroke_widths):
+                k = image_ids[cc.row_min, cc.col_min]
+                cc.translate(-self.rows[k], -self.cols[k])
+                components[k].append(cc)
+
+            for k, image_components in enumerate(components):
+                image_components = filter_connected_components.run(image_components, config.max_components,
+                                                                   config.filters)
+                # Chains are built from pairs, most small images have none
+                chains = []
+                if len(image_components) > 1:
+                    chains = letter_chains.run(image_components, config.max_pairs, config.chains)
+                chain_boxes = letter_chains.get_bounding_boxes(chains)
+                directions = np.full((len(chain_boxes), 1), gradient_direction, np.int64)
+                boxes[k].append(np.hstack([chain_boxes, directions]))
+
+        return [np.vstack(image_boxes) for image_boxes in boxes]
@@ -1,7 +1,9 @@
 import numpy as np
 import math
+from . import backend
+from . import median
 
-def cast_ray(gx, gy, edges, row, col, dir, max_angle_diff):
+def cast_ray(gx, gy, edges, row, col, dir, max_angle_diff, region=None):
     """Casts a ray in an image given a starting point, an edge set, and the gradient
     Applies the SWT algorithm steps and outputs bounding boxes.
 
@@ -14,6 +16,8 @@ def cast_ray(gx, gy, edges, row, col, dir, max_angle_diff):
     col -- the starting column location in the image
     dir -- either 1 (light text) or -1 (dark text), the direction the ray should be cast
     max_angle_diff -- Controls how far from directly opposite the two edge gradeints should be
+    region -- optional image, rays reaching a pixel where it is 0 are dropped like rays leaving the image.
+              edges must be nonzero there too, the region is only looked up where a ray stops
     """
 
     i = 1
@@ -37,9 +41,14 @@ def cast_ray(gx, gy, edges, row, col, dir, max_angle_diff):
         col_step = math.floor(col + 0.5 + g_col_norm * i)
         row_step = math.floor(row + 0.5 + g_row_norm * i)
         i += 1
+        # Rays leaving the image are dropped, negative indices would wrap around to the opposite border
+        if row_step < 0 or col_step < 0:
+            return None
         try:
             # Checking if the next step is an edge
             if edges[row_step, col_step] > 0:
+                if region is not None and region[row_step, col_step] == 0:
+                    return None
                 # Checking that edge pixels gradient is approximately opposite the direction of travel
                 g_opp_row = gx[row_step, col_step] * dir
                 g_opp_col = gy[row_step, col_step] * dir
@@ -59,6 +68,70 @@ def cast_ray(gx, gy, edges, row, col, dir, max_angle_diff):
             return None
 
 
+@backend.register_kernel("cast_rays")
+def cast_rays(gx, gy, edges, origin_rows, origin_cols, dir, max_angle_diff, region=None):
+    """Casts a ray from each origin, see cast_ray.
+    Returns the rays that reached an opposite edge stored end to end as
+    (offsets, rows, cols), ray i covers rows[offsets[i]:offsets[i + 1]]
+    """
+    if region is not None:
+        # Pixels outside the region stop rays like edges do, see cast_ray
+        edges = np.where(region, edges, 255)
+
+    offsets = [0]
+    rows = []
+    cols = []
+    for row, col in zip(origin_rows.tolist(), origin_cols.tolist()):
+        ray = cast_ray(gx, gy, edges, row, col, dir, max_angle_diff, region)
+        if ray != None:
+            for point in ray:
+                rows.append(point[0])
+                cols.append(point[1])
+            offsets.append(len(rows))
+
+    return np.array(offsets, np.int64), np.array(rows, np.int64), np.array(cols, np.int64)
+
+
+class Rays:
+    """Container for rays stored end to end, as returned by the cast_rays kernel"""
+    def __init__(self, offsets, rows, cols):
+        self.offsets = offsets
+        self.rows = rows
+        self.cols = cols
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # Returns the ray each stored point belongs to
+    def get_ray_indices(self):
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    # Returns the rays at the given indices, in that order
+    def take(self, indices):
+        lengths = np.diff(self.offsets)[indices]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        points = np.repeat(self.offsets[:-1][indices] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return Rays(offsets, self.rows[points], self.cols[points])
+
+    # Returns the distance between the first and last point of each ray
+    def get_widths(self):
+        first = self.offsets[:-1]
+        last = self.offsets[1:] - 1
+        return np.sqrt((self.rows[last] - self.rows[first]) ** 2 + (self.cols[last] - self.cols[first]) ** 2)
+
+
+def concatenate_rays(rays_list):
+    """Joins several Rays into one, keeping their order"""
+    offsets = [np.zeros(1, np.int64)]
+    total = 0
+    for rays in rays_list:
+        offsets.append(rays.offsets[1:] + total)
+        total += rays.offsets[-1]
+    rows = np.concatenate([np.empty(0, np.int64)] + [rays.rows for rays in rays_list])
+    cols = np.concatenate([np.empty(0, np.int64)] + [rays.cols for rays in rays_list])
+    return Rays(np.concatenate(offsets), rows, cols)
+
+
 def magnitude(x, y):
     return math.sqrt(x * x + y * y)
 
@@ -77,6 +150,12 @@ def angle_between(x1, y1, x2, y2):
         return math.acos(dot(x1, y1, x2, y2) / (magnitude(x1, y1) * magnitude(x2, y2)))
 
 
+@backend.register_kernel("ray_medians")
+def get_ray_medians(values, offsets):
+    """Returns the median of each ray's values, values are stored end to end like Rays"""
+    return median.segmented_median(values, offsets)
+
+
 def median_ray(ray, swt_img):
     # Accumulate pixel values and calculate median
     pixel_values = []
@@ -1,7 +1,11 @@
 import copy
 import cv2
 import numpy as np
+import itertools
+import time
 from typing import List
+from . import backend
+from . import median
 
 # 8 connected relative directions
 __directions8__ = [
@@ -33,6 +37,20 @@ def run(gray_img, swt_median_image):
     
     swt_median_image -- An image with SWT applied to it
     """
+    component_image = np.zeros(swt_median_image.shape)
+    connected_component_data = list(iter_components(gray_img, swt_median_image, component_image))
+    return component_image, connected_component_data
+
+
+def iter_components(gray_img, swt_median_image, component_image=None):
+    """Generator version of run(), yields each component as soon as it is grown.
+    Only components run() would return are yielded.
+
+    Keyword Arguments
+
+    swt_median_image -- An image with SWT applied to it
+    component_image -- optional image the component labels are written to
+    """
     # Copying so we can remove pixels to keep track
     # of components found
     pixel_source = copy.deepcopy(swt_median_image)
@@ -41,30 +59,38 @@ def run(gray_img, swt_median_image):
     label = 1
 
     # Creating an empty image to store connected components
-    component_image = np.zeros(pixel_source.shape)
-    component_image[:] = 0
-
-    # connected component data
-    connected_component_data = []
-
-    for row in range(pixel_source.shape[0]):
-        for col in range(pixel_source.shape[1]):
-            if pixel_source[row, col] > 0:
-                # Create a new data storage object
-                component_data = ConnectedComponentData(row, col, label)
-                region_grow_stack(gray_img, pixel_source, component_image, label, row, col, component_data)
-                # Keep track of the component data
-                if component_data.area > 5:
-                    connected_component_data.append(component_data)
-                label = label + 1
+    if component_image is None:
+        component_image = np.zeros(pixel_source.shape)
+
+    # Stroke pixels in row-major order, any of them can seed a new component
+    seed_rows, seed_cols = np.nonzero(pixel_source > 0)
+    for row, col in zip(seed_rows.tolist(), seed_cols.tolist()):
+        # Skipping pixels already taken by a previous component
+        if pixel_source[row, col] > 0:
+            # Create a new data storage object
+            component_data = ConnectedComponentData(row, col, label)
+            region_grow_stack(gray_img, pixel_source, component_image, label, row, col, component_data)
+            # Components are complete once grown, small ones are dropped
+            if component_data.area > 5:
+                yield component_data
+            label = label + 1
 
-    return component_image, connected_component_data
 
+def region_grow_stack(gray_img, pixel_source, component_image, label, row, col, component_data, connect8=True, max_ratio=3):
+    """A stack based implementation of the region growing algorithm.
+    Grows the component starting at (row, col) and adds its pixels to component_data.
+    """
+    rows, cols, stroke_widths, grays = backend.get_kernel("region_grow")(
+        gray_img, pixel_source, component_image, label, row, col, connect8, max_ratio)
+    component_data.add_pixels(rows, cols, stroke_widths, grays)
 
 
 # This method is more gross than the recusive one, but does not break number of frames allowed
-def region_grow_stack(gray_img, pixel_source, component_image, label, row, col, component_data, connect8=True, max_ratio=3):
-    """A stack based implementation of the region growing algorithm"""
+@backend.register_kernel("region_grow")
+def grow_region(gray_img, pixel_source, component_image, label, row, col, connect8, max_ratio):
+    """Grows a region from (row, col), removing its pixels from pixel_source and labeling them
+    in component_image. Returns the (rows, cols, stroke_widths, grays) of the region's pixels
+    """
 
     if connect8:
         num_directions = 8
@@ -73,10 +99,18 @@ def region_grow_stack(gray_img, pixel_source, component_image, label, row, col,
         num_directions = 4
         directions = __directions4__
 
+    rows = []
+    cols = []
+    stroke_widths = []
+    grays = []
+
     initial_stroke_width = pixel_source[row, col]
     # Delete visited pixel
     pixel_source[row, col] = 0
-    component_data.add_pixel(row, col, initial_stroke_width, gray_img[row, col])
+    rows.append(row)
+    cols.append(col)
+    stroke_widths.append(initial_stroke_width)
+    grays.append(gray_img[row, col])
     # label visited pixel
     component_image[row, col] = label
 
@@ -88,6 +122,9 @@ def region_grow_stack(gray_img, pixel_source, component_image, label, row, col,
             # Getting coords we're going to check to grow into
             row_shift = row + directions[i][0]
             col_shift = col + directions[i][1]
+            # Negative indices would wrap around to the opposite border
+            if row_shift < 0 or col_shift < 0:
+                continue
 
             adj_value = pixel_source[row_shift, col_shift]
 
@@ -95,7 +132,10 @@ def region_grow_stack(gray_img, pixel_source, component_image, label, row, col,
             if adj_value > 0:
                 if initial_stroke_width / adj_value < max_ratio and adj_value / initial_stroke_width < max_ratio:
                     # update connected component tracking data structures
-                    component_data.add_pixel(row_shift, col_shift, adj_value, gray_img[row, col])
+                    rows.append(row_shift)
+                    cols.append(col_shift)
+                    stroke_widths.append(adj_value)
+                    grays.append(gray_img[row, col])
                     pixel_source[row_shift, col_shift] = 0
                     component_image[row_shift, col_shift] = label
                     # put on stack
@@ -113,6 +153,8 @@ def region_grow_stack(gray_img, pixel_source, component_image, label, row, col,
                 # Getting coords we're going to check to grow into
                 row_shift = curr_pixel.row + directions[i][0]
                 col_shift = curr_pixel.col + directions[i][1]
+                if row_shift < 0 or col_shift < 0:
+                    continue
 
                 adj_value = pixel_source[row_shift, col_shift]
 
@@ -121,7 +163,10 @@ def region_grow_stack(gray_img, pixel_source, component_image, label, row, col,
                     # Checking stroke width ration does not exceed max ratio
                     if curr_pixel.stroke_width / adj_value < max_ratio and curr_pixel.stroke_width / initial_stroke_width < max_ratio:
                         # update connected component tracking data structures
-                        component_data.add_pixel(row_shift, col_shift, adj_value, gray_img[row_shift, col_shift])
+                        rows.append(row_shift)
+                        cols.append(col_shift)
+                        stroke_widths.append(adj_value)
+                        grays.append(gray_img[row_shift, col_shift])
                         pixel_source[row_shift, col_shift] = 0
                         component_image[row_shift, col_shift] = label
                         # put on stack
@@ -131,6 +176,145 @@ def region_grow_stack(gray_img, pixel_source, component_image, label, row, col,
             except IndexError:
                 continue
 
+    return (np.array(rows, np.int64), np.array(cols, np.int64),
+            np.array(stroke_widths, np.float64), np.array(grays, gray_img.dtype))
+
+
+def run_sparse(gray_img, stroke_widths):
+    """Same as run(), for a swt.SparseStrokeWidths.
+    Work and memory scale with the number of stroke pixels instead of the image area.
+    Returns the label of each stroke pixel instead of a component image.
+    """
+    labels = np.zeros(len(stroke_widths))
+    connected_component_data = list(iter_sparse(gray_img, stroke_widths, labels))
+    return labels, connected_component_data
+
+
+def iter_sparse(gray_img, stroke_widths, labels=None, deadline=None):
+    """Generator version of run_sparse(), yields each component as soon as it is grown.
+    Only components run_sparse() would return are yielded.
+
+    Keyword Arguments
+
+    stroke_widths -- a swt.SparseStrokeWidths
+    labels -- optional array the label of each stroke pixel is written to
+    deadline -- optional time.monotonic() time after which no more components are grown
+    """
+    keys = stroke_widths.get_keys()
+    # Looking up the neighbours of every stroke pixel at once, growing then only follows indices
+    neighbours = get_neighbour_indices(keys, stroke_widths.shape, __directions8__)
+    # Copying so we can remove pixels to keep track of components found
+    pixel_source = stroke_widths.widths.copy()
+    if labels is None:
+        labels = np.zeros(len(keys))
+    grow = backend.get_kernel("region_grow_sparse")
+
+    label = 1
+    # Stroke pixels are in row-major order, the same order run() scans in
+    for seed in range(len(keys)):
+        # Skipping pixels already taken by a previous component
+        if pixel_source[seed] > 0:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            row = int(stroke_widths.rows[seed])
+            col = int(stroke_widths.cols[seed])
+            component_data = ConnectedComponentData(row, col, label)
+            rows, cols, widths, grays = grow(gray_img, keys, neighbours, pixel_source, labels, stroke_widths.shape,
+                                             label, seed, True, 3)
+            component_data.add_pixels(rows, cols, widths, grays)
+            if component_data.area > 5:
+                yield component_data
+            label = label + 1
+
+
+def get_neighbour_indices(keys, shape, directions):
+    """Returns the index in the sorted keys of each pixel's neighbour in each direction, -1 if it has
+    no stroke width or lies outside the image, with one vectorized search for all pixels.
+    """
+    num_rows, num_cols = shape
+    directions = np.asarray(directions, np.int64)
+    if len(keys) == 0:
+        return np.empty((0, len(directions)), np.int64)
+
+    # One row per direction, each row is sorted like the keys, which keeps the search local
+    rows = directions[:, :1] + keys // num_cols
+    cols = directions[:, 1:] + keys % num_cols
+    neighbour_keys = rows * num_cols + cols
+    indices = np.minimum(np.searchsorted(keys, neighbour_keys), len(keys) - 1)
+    inside = (rows >= 0) & (rows < num_rows) & (cols >= 0) & (cols < num_cols)
+    return np.ascontiguousarray(np.where(inside & (keys[indices] == neighbour_keys), indices, -1).T)
+
+
+@backend.register_kernel("region_grow_sparse")
+def grow_region_sparse(gray_img, keys, neighbours, pixel_source, labels, shape, label, seed, connect8, max_ratio):
+    """Sparse version of grow_region. pixel_source and labels hold one value per key,
+    neighbours is the table get_neighbour_indices returns for the same directions.
+    """
+
+    if connect8:
+        directions = __directions8__
+    else:
+        directions = __directions4__
+    num_cols = shape[1]
+
+    row = int(keys[seed] // num_cols)
+    col = int(keys[seed] % num_cols)
+    initial_stroke_width = pixel_source[seed]
+    pixel_source[seed] = 0
+    labels[seed] = label
+
+    rows = [row]
+    cols = [col]
+    stroke_widths = [initial_stroke_width]
+    grays = [gray_img[row, col]]
+
+    # Pixels waiting to be grown from, as (row, col, stroke width, index)
+    pixel_stack = []
+    for direction, index in zip(directions, neighbours[seed].tolist()):
+        row_shift = row + direction[0]
+        col_shift = col + direction[1]
+        if index < 0:
+            continue
+        adj_value = pixel_source[index]
+        if adj_value > 0:
+            if initial_stroke_width / adj_value < max_ratio and adj_value / initial_stroke_width < max_ratio:
+                rows.append(row_shift)
+                cols.append(col_shift)
+                stroke_widths.append(adj_value)
+                # grow_region records the seed's gray for these pixels
+                grays.append(gray_img[row, col])
+                pixel_source[index] = 0
+                labels[index] = label
+                pixel_stack.append((row_shift, col_shift, adj_value, index))
+
+    while len(pixel_stack) > 0:
+        curr_row, curr_col, curr_width, curr_index = pixel_stack.pop()
+        for direction, index in zip(directions, neighbours[curr_index].tolist()):
+            row_shift = curr_row + direction[0]
+            col_shift = curr_col + direction[1]
+            if index < 0:
+                continue
+            adj_value = pixel_source[index]
+            if adj_value > 0:
+                if curr_width / adj_value < max_ratio and curr_width / initial_stroke_width < max_ratio:
+                    rows.append(row_shift)
+                    cols.append(col_shift)
+                    stroke_widths.append(adj_value)
+                    grays.append(gray_img[row_shift, col_shift])
+                    pixel_source[index] = 0
+                    labels[index] = label
+                    pixel_stack.append((row_shift, col_shift, adj_value, index))
+
+    return (np.array(rows, np.int64), np.array(cols, np.int64),
+            np.array(stroke_widths, np.float64), np.array(grays, gray_img.dtype))
+
+
+def get_component_image(labels, stroke_widths):
+    """Builds the component image run() returns from the labels returned by run_sparse()"""
+    component_image = np.zeros(stroke_widths.shape)
+    component_image[stroke_widths.rows, stroke_widths.cols] = labels
+    return component_image
+
 
 class ConnectedComponentData:
     """This class is utilized as a data container for the cc algorithm
@@ -145,7 +329,12 @@ class ConnectedComponentData:
 
         # label of component values and indexes of components
         self.label = label
-        self.pixel_coordinates = []
+
+        # Pixel locations are kept as chunks of coordinate arrays, joined on first use
+        self.__row_chunks = []
+        self.__col_chunks = []
+        self.__rows = None
+        self.__cols = None
 
         # Average center point of the components, calculate after
         self.__centroid = None
@@ -160,34 +349,115 @@ class ConnectedComponentData:
 
         # Statistical values to be calculated later
         self.__median_sw = None
-        self.__mean_gray = None
+        self.__mean_sw = None
 
         self.__variance_stroke_width = None
 
         self.__mean_gray = None
         self.__variance_gray = None
 
+        # Masks are derived from the pixel locations, calculate after
+        self.__runs = None
+        self.__mask = None
+
+    # Row of each pixel, in the order the pixels were added
+    def get_pixel_rows(self):
+        if self.__rows is None:
+            self.__join_pixels()
+        return self.__rows
+
+    # Column of each pixel, in the order the pixels were added
+    def get_pixel_cols(self):
+        if self.__cols is None:
+            self.__join_pixels()
+        return self.__cols
+
+    def __join_pixels(self):
+        if len(self.__row_chunks) == 0:
+            self.__rows = np.empty(0, np.int64)
+            self.__cols = np.empty(0, np.int64)
+        else:
+            self.__rows = np.concatenate(self.__row_chunks)
+            self.__cols = np.concatenate(self.__col_chunks)
+        self.__row_chunks = [self.__rows]
+        self.__col_chunks = [self.__cols]
+
+    # [row, col] of each pixel as lists, prefer get_pixel_rows() and get_pixel_cols()
+    @property
+    def pixel_coordinates(self):
+        return np.stack([self.get_pixel_rows(), self.get_pixel_cols()], axis=1).tolist()
+
+    def get_runs(self):
+        """Returns the run-length encoded mask, one [row, col_start, col_end) run per line.
+        Runs are sorted by row, then by column.
+        """
+        if self.__runs is None:
+            rows = self.get_pixel_rows()
+            cols = self.get_pixel_cols()
+            order = np.lexsort((cols, rows))
+            rows = rows[order]
+            cols = cols[order]
+
+            # A run ends where the row changes or the columns stop being consecutive
+            breaks = np.nonzero((np.diff(rows) != 0) | (np.diff(cols) != 1))[0] + 1
+            starts = np.concatenate([[0], breaks])
+            ends = np.concatenate([breaks, [len(rows)]]) - 1
+            self.__runs = np.stack([rows[starts], cols[starts], cols[ends] + 1], axis=1)
+        return self.__runs
+
+    def get_mask(self):
+        """Returns a boolean mask of the component cropped to its bounding box"""
+        if self.__mask is None:
+            mask = np.zeros((self.row_max - self.row_min + 1, self.col_max - self.col_min + 1), bool)
+            mask[self.get_pixel_rows() - self.row_min, self.get_pixel_cols() - self.col_min] = True
+            self.__mask = mask
+        return self.__mask
+
+    def get_overlap_area(self, other):
+        """Returns the number of pixels this component shares with another"""
+        row_min = max(self.row_min, other.row_min)
+        row_max = min(self.row_max, other.row_max)
+        col_min = max(self.col_min, other.col_min)
+        col_max = min(self.col_max, other.col_max)
+        if row_min > row_max or col_min > col_max:
+            return 0
+
+        mask = self.get_mask()[row_min - self.row_min:row_max - self.row_min + 1,
+                               col_min - self.col_min:col_max - self.col_min + 1]
+        other_mask = other.get_mask()[row_min - other.row_min:row_max - other.row_min + 1,
+                                      col_min - other.col_min:col_max - other.col_min + 1]
+        return int(np.count_nonzero(mask & other_mask))
+
+    # Moves the component by the given offset, e.g. from tile to image coordinates
+    def translate(self, row_offset, col_offset):
+        rows = self.get_pixel_rows() + row_offset
+        cols = self.get_pixel_cols() + col_offset
+        self.__row_chunks = [rows]
+        self.__col_chunks = [cols]
+        self.__rows = rows
+        self.__cols = cols
+        self.row_min += row_offset
+        self.row_max += row_offset
+        self.col_min += col_offset
+        self.col_max += col_offset
+
+        self.__centroid = None
+        self.__runs = None
+
     def get_centroid(self):
         if self.__centroid is None:
-            row_sum = 0
-            col_sum = 0
-            for coord in self.pixel_coordinates:
-                row_sum += coord[0]
-                col_sum += coord[1]
-
-            n = len(self.pixel_coordinates)
-            self.__centroid = [row_sum / n, col_sum / n]
+            self.__centroid = [float(self.get_pixel_rows().mean()), float(self.get_pixel_cols().mean())]
         return self.__centroid
 
     def get_mean_stroke_width(self):
-        if self.__mean_gray is None:
-            self.__mean_gray = np.average(self.stroke_widths)
+        if self.__mean_sw is None:
+            self.__mean_sw = np.average(self.stroke_widths)
 
-        return self.__mean_gray
+        return self.__mean_sw
 
     def get_median_stroke_width(self):
         if self.__median_sw is None:
-            self.__median_sw = np.median(self.stroke_widths)
+            self.__median_sw = median.median(self.stroke_widths)
 
         return self.__median_sw
 
@@ -233,10 +503,34 @@ class ConnectedComponentData:
     def get_width(self):
         return self.col_max - self.col_min
 
+    # updates the values this component contains with many pixels at once
+    def add_pixels(self, rows, cols, stroke_widths, grays):
+        if len(rows) == 0:
+            return
+
+        self.__row_chunks.append(np.asarray(rows, np.int64))
+        self.__col_chunks.append(np.asarray(cols, np.int64))
+        self.__rows = None
+        self.__cols = None
+        self.stroke_widths.extend(stroke_widths.tolist())
+        self.grays.extend(grays.tolist())
+
+        # update bounds
+        self.row_min = min(self.row_min, int(rows.min()))
+        self.row_max = max(self.row_max, int(rows.max()))
+        self.col_min = min(self.col_min, int(cols.min()))
+        self.col_max = max(self.col_max, int(cols.max()))
+
+        # update pixel total
+        self.area += len(rows)
+
     # updates the values this component contains
     def add_pixel(self, row, col, stroke_width, gray_value):
         # add location and stroke width information
-        self.pixel_coordinates.append([row, col])
+        self.__row_chunks.append(np.array([row], np.int64))
+        self.__col_chunks.append(np.array([col], np.int64))
+        self.__rows = None
+        self.__cols = None
         self.stroke_widths.append(stroke_width)
         self.grays.append(gray_value)
 
@@ -262,19 +556,38 @@ class Pixel:
         self.stroke_width = stroke_width
 
 
+def get_median_stroke_widths(cc_data: List[ConnectedComponentData]):
+    """Returns the median stroke width of each component, computed in one call"""
+    lengths = np.array([len(cc.stroke_widths) for cc in cc_data], np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    values = np.fromiter(itertools.chain.from_iterable(cc.stroke_widths for cc in cc_data), np.float64, offsets[-1])
+    return median.segmented_median(values, offsets)
+
+
 def get_connected_component_image(cc_data: List[ConnectedComponentData], num_rows: int, num_cols: int):
+    """Returns a single channel image that is 255 at the pixels of the given components"""
     blank = np.zeros([num_rows, num_cols, 1], np.uint8)
-    for cc in cc_data:
-        label = min(255, cc.label)
-        for coord in cc.pixel_coordinates:
-            blank[coord[0], coord[1]] = 255
+    if len(cc_data) > 0:
+        rows = np.concatenate([cc.get_pixel_rows() for cc in cc_data])
+        cols = np.concatenate([cc.get_pixel_cols() for cc in cc_data])
+        blank[rows, cols] = 255
 
     return blank
 
 
+def render_runs(runs, num_rows: int, num_cols: int):
+    """Returns a boolean image that is True inside the given [row, col_start, col_end) runs"""
+    # Marking where each run starts and ends, then filling between with a running sum along the rows
+    changes = np.zeros((num_rows, num_cols + 1), np.int32)
+    np.add.at(changes, (runs[:, 0], runs[:, 1]), 1)
+    np.add.at(changes, (runs[:, 0], runs[:, 2]), -1)
+    return np.cumsum(changes, axis=1)[:, :num_cols] > 0
+
+
 # Default color is red
-def make_image_with_bounding_boxes(img, ccs: List[ConnectedComponentData], color=(0, 0, 255)):
-    img_drawn = copy.deepcopy(img)
+def make_image_with_bounding_boxes(img, ccs: List[ConnectedComponentData], color=(0, 0, 255), in_place=False):
+    # Drawing in place skips copying the image
+    img_drawn = img if in_place else copy.deepcopy(img)
     for cc in ccs:
         # Bounding-box top-left clockwise
         bb = cc.get_bounding_box()
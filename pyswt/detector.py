@@ -0,0 +1,206 @@
+import contextlib
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from . import backend
+from . import connected_component
+from . import filter_connected_components
+from . import letter_chains
+from . import memory
+from . import prefilter
+from . import swt
+from .filter_connected_components import FilterConfig
+from .letter_chains import ChainConfig
+
+
+class DetectorConfig(NamedTuple):
+    """Settings of a Detector. Immutable, change settings with config._replace(...)"""
+    # Compute backend, None uses the backend selected with backend.set_backend
+    backend: Optional[str] = None
+    # Candidate caps, see filter_connected_components.run and letter_chains.run
+    max_components: Optional[int] = None
+    max_pairs: Optional[int] = None
+    # Thresholds of the component and letter chain filters
+    filters: FilterConfig = FilterConfig()
+    chains: ChainConfig = ChainConfig()
+    # Memory ceiling in bytes. Images that would need more are processed in tiles, see memory.py
+    memory_limit: Optional[int] = None
+    # Casts rays only in the tiles passing prefilter.run_on_gradients, computed from the detector's own gradients
+    prefilter: bool = False
+
+
+class Detector:
+    """Runs the SWT pipeline with its own configuration.
+    A detector keeps no state between calls, every buffer belongs to a single call,
+    so one detector can be used from many threads at once. Detectors with different
+    configurations can be used side by side.
+
+    Keyword Arguments:
+
+    config -- the DetectorConfig to detect with
+    """
+    def __init__(self, config: DetectorConfig = DetectorConfig()):
+        if config.backend is not None:
+            backend.check_backend(config.backend)
+        self.config = config
+
+    def detect(self, img, text_mask=None, report=None):
+        """Returns the letter chains for light and dark text, see pyswt.detect
+
+        Keyword Arguments:
+
+        img -- the image to apply SWT on
+        text_mask -- optional boolean image limiting where rays are cast, see prefilter.py
+        report -- optional memory.MemoryReport, records the memory use and output size of each stage
+        """
+        memory_limit = self.config.memory_limit
+        if memory_limit is None:
+            return self.__detect(img, text_mask, report)
+
+        tile_size = memory.get_tile_size(img.shape[:2], memory_limit)
+        if tile_size is None:
+            try:
+                return self.__detect(img, text_mask, report)
+            except MemoryError:
+                # The estimate was too low for this image, retrying with tiles sized for a higher one
+                tile_size = memory.get_retry_tile_size(img.shape[:2], memory_limit)
+                if tile_size is None:
+                    raise
+        return self.__detect_tiled(img, text_mask, report, tile_size)
+
+    def detect_boxes(self, img, text_mask=None, report=None):
+        """Runs detect() and returns the boxes as a compact array, see pyswt.detect_boxes"""
+        return get_boxes(self.detect(img, text_mask, report))
+
+    def __detect(self, img, text_mask, report):
+        config = self.config
+        with self.__use_backend(), self.__trace(report):
+            # Converting image to grayscale
+            with memory.track(report, "edges"):
+                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+                edges, gx, gy = swt.get_edges_and_gradients(gray)
+
+                # Rays start on edges, optionally restricted to the masked area and the tiles passing the prefilter
+                region = text_mask
+                if config.prefilter:
+                    passing = prefilter.run_on_gradients(edges, gx, gy).get_mask()
+                    region = passing if region is None else region & passing
+                origins = edges > 0
+                if region is not None:
+                    origins &= region
+                origin_rows, origin_cols = np.nonzero(origins)
+
+            # Once for light text, once for dark text
+            chains_light_dark = []
+            for gradient_direction in [1, -1]:
+                with memory.track(report, "rays"):
+                    rays = swt.cast_rays(gx, gy, edges, origin_rows, origin_cols, gradient_direction, region)
+                with memory.track(report, "stroke_widths"):
+                    stroke_widths = swt.sparse_from_rays(gray.shape, rays)
+
+                # Components are filtered as they are grown, rejected ones are never collected
+                with memory.track(report, "components"):
+                    connected_component_data = connected_component.iter_sparse(gray, stroke_widths)
+                    if report is not None:
+                        connected_component_data = report.count_components(connected_component_data)
+                    filtered_components = filter_connected_components.run(connected_component_data,
+                                                                          config.max_components, config.filters)
+                with memory.track(report, "chains"):
+                    chains = letter_chains.run(filtered_components, config.max_pairs, config.chains)
+                chains_light_dark.append(chains)
+
+                if report is not None:
+                    report.add_count("rays", len(rays))
+                    report.add_count("ray_pixels", len(rays.rows))
+                    report.add_count("stroke_pixels", len(stroke_widths))
+                    report.add_count("letter_candidates", len(filtered_components))
+                    report.add_count("chains", len(chains))
+
+        return chains_light_dark
+
+    def __detect_tiled(self, img, text_mask, report, tile_size):
+        """Runs detection on overlapping tiles and merges the chains found.
+        Tiles overlap by the tallest allowed chain, so every line of text that fits
+        in a tile is found whole in at least one of them.
+        """
+        overlap = min(self.config.chains.max_chain_height, tile_size // 2)
+        tiles = get_tiles(img.shape[:2], tile_size, overlap)
+        if report is not None:
+            report.tiles = len(tiles)
+            report.tile_size = tile_size
+
+        tile_chains = [[], []]
+        for row, col in tiles:
+            tile = (slice(row, row + tile_size), slice(col, col + tile_size))
+            tile_mask = None if text_mask is None else text_mask[tile]
+            for chains_tiles, chains in zip(tile_chains, self.__detect(img[tile], tile_mask, report)):
+                translate_chains(chains, row, col)
+                chains_tiles.append(chains)
+
+        return [merge_tile_chains(chains_tiles) for chains_tiles in tile_chains]
+
+    @staticmethod
+    def __trace(report):
+        if report is None:
+            return contextlib.nullcontext()
+        return report.trace()
+
+    def __use_backend(self):
+        return use_config_backend(self.config)
+
+
+def use_config_backend(config: DetectorConfig):
+    """Returns a context selecting the backend of a DetectorConfig for the current thread"""
+    if config.backend is None:
+        return contextlib.nullcontext()
+    return backend.use_backend(config.backend)
+
+
+def get_boxes(chains_light_dark):
+    """Converts the chains returned by detect() to a box array, see detect_boxes"""
+    boxes = []
+    for chains, gradient_direction in zip(chains_light_dark, [1, -1]):
+        chain_boxes = letter_chains.get_bounding_boxes(chains)
+        directions = np.full((len(chain_boxes), 1), gradient_direction, np.int64)
+        boxes.append(np.hstack([chain_boxes, directions]))
+    return np.vstack(boxes)
+
+
+def get_tiles(shape, tile_size, overlap):
+    """Returns the top-left corners of overlapping square tiles covering an image"""
+    step = max(1, tile_size - overlap)
+    rows = list(range(0, max(shape[0] - overlap, 1), step))
+    cols = list(range(0, max(shape[1] - overlap, 1), step))
+    return [(row, col) for row in rows for col in cols]
+
+
+def translate_chains(chains, row_offset, col_offset):
+    """Moves chains and their components from tile to image coordinates"""
+    components = {id(cc): cc for chain in chains for cc in chain.chain}
+    for cc in components.values():
+        cc.translate(row_offset, col_offset)
+    for chain in chains:
+        chain.translate(row_offset, col_offset)
+
+
+def merge_tile_chains(chains_tiles):
+    """Joins the chains found in each tile, dropping chains that lie inside a chain of another tile.
+    Of identical chains found in several tiles, the one from the first tile is kept.
+    """
+    chains = [chain for chains in chains_tiles for chain in chains]
+    if len(chains) == 0:
+        return []
+
+    tile_ids = np.repeat(np.arange(len(chains_tiles)), [len(chains) for chains in chains_tiles])
+    boxes = letter_chains.get_bounding_boxes(chains)
+    row_min, col_min, row_max, col_max = (boxes[:, k] for k in range(4))
+
+    # contains[i, j] is True if chain i's box contains chain j's box
+    contains = ((row_min[:, None] <= row_min) & (col_min[:, None] <= col_min)
+                & (row_max[:, None] >= row_max) & (col_max[:, None] >= col_max))
+    identical = contains & contains.T
+    other_tile = tile_ids[:, None] != tile_ids
+    dropped = other_tile & contains & (~identical | (tile_ids[:, None] < tile_ids))
+    return [chain for chain, drop in zip(chains, dropped.any(axis=0)) if not drop]
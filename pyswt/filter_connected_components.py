@@ -1,40 +1,88 @@
+import numpy as np
+
 from .connected_component import ConnectedComponentData
-from typing import List
+from typing import Iterable, List, NamedTuple
 
 # Magic number as specified by the paper
 __stroke_width_variance_coeff = 0.5  # I do not use this
 
-# Some magic numbers from the paper, others I found empirically
-__max_stroke_width_variance_to_area_ratio = 0.05
-__aspect_ratio_upper_bound = 5
-__aspect_ratio_lower_bound = 1.0 / __aspect_ratio_upper_bound
-__height_lower_bound = 10
-__height_upper_bound = 300
 
-__max_width_to_height_ratio = 2.00
+class FilterConfig(NamedTuple):
+    """Thresholds of the component filters"""
+    # Some magic numbers from the paper, others I found empirically
+    max_stroke_width_variance_to_area_ratio: float = 0.05
+    aspect_ratio_upper_bound: float = 5
+    aspect_ratio_lower_bound: float = 1.0 / 5
+    height_lower_bound: int = 10
+    height_upper_bound: int = 300
+    min_bounding_box_area: int = 100
 
-__num_components_embedded_max = 4
+    max_width_to_height_ratio: float = 2.00
 
+    num_components_embedded_max: int = 4
+
+
+__default_config = FilterConfig()
+
+# Number of components compared against all others at once by the containment filter
+__block_size = 1024
 
-def run(connected_components_data: List[ConnectedComponentData]):
-    # Filter from cheapest to calculate to most expensive
-    filtered_data = connected_components_data
-    filtered_data = filter_by_bounding_box_area(filtered_data)
-    filtered_data = filter_by_component_height(filtered_data)
-    filtered_data = filter_by_aspect_ratio(filtered_data)
-    filtered_data = filter_by_relative_width(filtered_data)
 
-    # if dropping text, it might be this method...
-    filtered_data = filter_by_stroke_width_variance(filtered_data)
+def run(connected_components_data: Iterable[ConnectedComponentData], max_components=None,
+        config: FilterConfig = __default_config):
+    """Removes components that are unlikely to be letters
+
+    Keyword Arguments:
+
+    connected_components_data -- the components found by connected_component.run, or a generator
+                                 such as connected_component.iter_sparse. Components from a generator
+                                 are filtered as they arrive and only the survivors are kept.
+    max_components -- if set, at most this many components with the most uniform
+                      stroke widths are kept before the quadratic containment filter
+    config -- the filter thresholds
+    """
+    filtered_data = list(iter_filtered(connected_components_data, config))
+
+    if max_components is not None:
+        filtered_data = keep_most_uniform_components(filtered_data, max_components)
 
     # Currently, there seems like there is a bug that causes a few components to have huge bounding boxes
     # TODO: components randomly have huge bounding boxes, causing this to break, fix this bug
-    filtered_data = filter_if_contains_other_components(filtered_data)
+    filtered_data = filter_if_contains_other_components(filtered_data, config)
 
     return filtered_data
 
 
-def filter_by_stroke_width_variance(cc_data: List[ConnectedComponentData]):
+def iter_filtered(cc_data: Iterable[ConnectedComponentData], config: FilterConfig = __default_config):
+    """Yields the components that pass the single component filters, as they arrive"""
+    for cc in cc_data:
+        if is_letter_candidate(cc, config):
+            yield cc
+
+
+def is_letter_candidate(cc: ConnectedComponentData, config: FilterConfig = __default_config):
+    """Applies the single component filters run() uses to one component.
+    Same result as filter_by_bounding_box_area, filter_by_component_height, filter_by_aspect_ratio,
+    filter_by_relative_width and filter_by_stroke_width_variance, tested in that order.
+    """
+    # Filter from cheapest to calculate to most expensive
+    height = cc.row_max - cc.row_min
+    width = cc.col_max - cc.col_min
+    if width * height < config.min_bounding_box_area:
+        return False
+    if not config.height_lower_bound <= height <= config.height_upper_bound:
+        return False
+    # discard ccs that are only one pixel wide
+    if width == 0 or not config.aspect_ratio_lower_bound <= height / width <= config.aspect_ratio_upper_bound:
+        return False
+    if width / height > config.max_width_to_height_ratio:
+        return False
+
+    # if dropping text, it might be this test...
+    return cc.get_variance_stroke_width() / cc.area < config.max_stroke_width_variance_to_area_ratio
+
+
+def filter_by_stroke_width_variance(cc_data: List[ConnectedComponentData], config: FilterConfig = __default_config):
     filtered_set = []
     for cc in cc_data:
         # Remove the point if the variance is above half the average stroke width. See paper for details
@@ -45,7 +93,7 @@ def filter_by_stroke_width_variance(cc_data: List[ConnectedComponentData]):
         if cc.get_variance_stroke_width() <= cc.get_mean_stroke_width() * __stroke_width_variance_coeff:
             filtered_set.append(cc)
         # """
-        if cc.get_variance_stroke_width()/cc.area < __max_stroke_width_variance_to_area_ratio:
+        if cc.get_variance_stroke_width()/cc.area < config.max_stroke_width_variance_to_area_ratio:
             filtered_set.append(cc)
             # print((cc.get_variance_stroke_width(), cc.area))
         # """
@@ -53,7 +101,17 @@ def filter_by_stroke_width_variance(cc_data: List[ConnectedComponentData]):
     return filtered_set
 
 
-def filter_by_aspect_ratio(cc_data: List[ConnectedComponentData]):
+def keep_most_uniform_components(cc_data: List[ConnectedComponentData], max_components: int):
+    if len(cc_data) <= max_components:
+        return cc_data
+
+    # Same measure as filter_by_stroke_width_variance, lower is more letter-like
+    scores = [cc.get_variance_stroke_width() / cc.area for cc in cc_data]
+    keep = sorted(sorted(range(len(cc_data)), key=lambda i: scores[i])[:max_components])
+    return [cc_data[i] for i in keep]
+
+
+def filter_by_aspect_ratio(cc_data: List[ConnectedComponentData], config: FilterConfig = __default_config):
     filtered_set = []
     for cc in cc_data:
         width = cc.col_max - cc.col_min
@@ -63,67 +121,64 @@ def filter_by_aspect_ratio(cc_data: List[ConnectedComponentData]):
 
         aspect_ratio = (cc.row_max - cc.row_min) / width
         # This constraint is also specified in the original SWT paper
-        if __aspect_ratio_lower_bound <= aspect_ratio <= __aspect_ratio_upper_bound:
+        if config.aspect_ratio_lower_bound <= aspect_ratio <= config.aspect_ratio_upper_bound:
             filtered_set.append(cc)
 
     return filtered_set
 
 
 # TODO: Make this proportional to image dimensions
-def filter_by_component_height(cc_data: List[ConnectedComponentData]):
+def filter_by_component_height(cc_data: List[ConnectedComponentData], config: FilterConfig = __default_config):
     filtered_set = []
     for cc in cc_data:
         # Learned parameter, see paper
-        if __height_lower_bound <= (cc.row_max - cc.row_min) <= __height_upper_bound:
+        if config.height_lower_bound <= (cc.row_max - cc.row_min) <= config.height_upper_bound:
             filtered_set.append(cc)
 
     return filtered_set
 
 
-def filter_by_relative_width(cc_data: List[ConnectedComponentData]):
+def filter_by_relative_width(cc_data: List[ConnectedComponentData], config: FilterConfig = __default_config):
     filtered_set = []
     for cc in cc_data:
-        if cc.get_width()/cc.get_height() <= __max_width_to_height_ratio:
+        if cc.get_width()/cc.get_height() <= config.max_width_to_height_ratio:
             filtered_set.append(cc)
 
     return filtered_set
 
 
-def filter_by_bounding_box_area(cc_data: List[ConnectedComponentData]):
+def filter_by_bounding_box_area(cc_data: List[ConnectedComponentData], config: FilterConfig = __default_config):
     filtered_set = []
     for cc in cc_data:
-        if cc.get_width() * cc.get_height() >= 100:
+        if cc.get_width() * cc.get_height() >= config.min_bounding_box_area:
             filtered_set.append(cc)
 
     return filtered_set
 
 
-def filter_if_contains_other_components(cc_data: List[ConnectedComponentData]):
-    filtered_set = []
-    for i in range(len(cc_data)):
-        num_components_embedded = 0
-        cc_0 = cc_data[i]
-        """
-        if ((cc_0.row_max - cc_0.row_min) * (cc_0.col_max - cc_0.col_min)) / cc_0.area > 10:
-            print("Max_Area: " + str((cc_0.row_max - cc_0.row_min) * (cc_0.col_max - cc_0.col_min)))
-            print("Area: " + str(cc_0.area))
-            print(str(cc_0.get_bounding_box()))
-        """
-        for j in range(len(cc_data)):
-            if j == i:
-                continue
-            else:
-                cc_1 = cc_data[j]
-                if (cc_0.row_min <= cc_1.row_min
-                        and cc_0.row_max >= cc_1.row_max
-                        and cc_0.col_min <= cc_1.col_min
-                        and cc_0.col_max >= cc_1.row_max
-                ):
-                    num_components_embedded += 1
-                    # print("(" + str(cc_0.row_min) + ", " + str(cc_0.col_min) + "), (" + str(cc_0.row_max) + ", " + str(
-                       # cc_0.col_max) + ")")
-
-        if num_components_embedded <= __num_components_embedded_max:
-            filtered_set.append(cc_0)
-
-    return filtered_set
+def filter_if_contains_other_components(cc_data: List[ConnectedComponentData],
+                                        config: FilterConfig = __default_config):
+    if len(cc_data) == 0:
+        return []
+
+    row_min = np.array([cc.row_min for cc in cc_data])
+    row_max = np.array([cc.row_max for cc in cc_data])
+    col_min = np.array([cc.col_min for cc in cc_data])
+    col_max = np.array([cc.col_max for cc in cc_data])
+
+    # Counting the components embedded in each component, a block of components at a time
+    # Note: the last test compares against the other component's row_max. This is what
+    # the filter was tuned with, so it is kept as is.
+    num_components_embedded = np.empty(len(cc_data), np.int64)
+    for start in range(0, len(cc_data), __block_size):
+        i = np.arange(start, min(start + __block_size, len(cc_data)))[:, None]
+        embedded = ((row_min[i] <= row_min)
+                    & (row_max[i] >= row_max)
+                    & (col_min[i] <= col_min)
+                    & (col_max[i] >= row_max))
+        # A component does not embed itself
+        embedded[np.arange(len(i)), i[:, 0]] = False
+        num_components_embedded[i[:, 0]] = np.count_nonzero(embedded, axis=1)
+
+    keep = np.nonzero(num_components_embedded <= config.num_components_embedded_max)[0]
+    return [cc_data[i] for i in keep]
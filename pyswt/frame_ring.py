@@ -0,0 +1,210 @@
+import collections
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .detector import Detector, DetectorConfig
+
+
+class FrameRing:
+    """Fixed-size frame slots in shared memory.
+    Frames are written in place by the producer and read as NumPy views by
+    other processes, so frames are never pickled.
+
+    Keyword Arguments:
+
+    num_slots -- number of frames the ring holds
+    frame_shape -- the largest frame shape a slot can hold, e.g. (1080, 1920, 3)
+    dtype -- frame data type
+    name -- name of an existing ring to attach to, a new ring is created if None
+    """
+    # Each slot has a header holding the shape of the frame stored in it
+    __header_size = 3
+
+    def __init__(self, num_slots, frame_shape, dtype=np.uint8, name=None):
+        self.num_slots = num_slots
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+
+        self.__slot_size = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        header_bytes = self.__header_size * np.dtype(np.int64).itemsize
+        size = num_slots * (self.__slot_size + header_bytes)
+
+        self.__owner = name is None
+        if self.__owner:
+            self.__shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.__shm = attach_shared_memory(name)
+
+        # Headers for all slots come first, followed by the frame data
+        self.__headers = np.ndarray((num_slots, self.__header_size), np.int64, self.__shm.buf)
+        self.__slots = np.ndarray((num_slots, self.__slot_size), np.uint8, self.__shm.buf, num_slots * header_bytes)
+
+    @property
+    def name(self):
+        return self.__shm.name
+
+    def get_description(self):
+        """Returns the arguments another process needs to attach to this ring"""
+        return self.num_slots, self.frame_shape, self.dtype.str, self.name
+
+    def reserve(self, slot, shape=None):
+        """Sets the shape of the frame stored in a slot and returns a writable view of it,
+        so a frame can be decoded or drawn straight into shared memory.
+
+        Keyword Arguments:
+
+        slot -- the slot to store the frame in
+        shape -- shape of the frame, must fit in frame_shape. Defaults to frame_shape
+        """
+        shape = self.frame_shape if shape is None else tuple(shape)
+        if len(shape) != len(self.frame_shape) or any(f > s for f, s in zip(shape, self.frame_shape)):
+            raise ValueError("Frame of shape " + str(shape) + " does not fit in " + str(self.frame_shape))
+
+        self.__headers[slot] = list(shape) + [0] * (self.__header_size - len(shape))
+        return self.get_frame(slot)
+
+    def write(self, slot, frame):
+        """Copies a frame into a slot. The frame must fit in frame_shape"""
+        np.copyto(self.reserve(slot, frame.shape), frame, casting="same_kind")
+
+    def get_frame(self, slot):
+        """Returns a view of the frame stored in a slot"""
+        shape = tuple(self.__headers[slot, :len(self.frame_shape)])
+        size = int(np.prod(shape)) * self.dtype.itemsize
+        return self.__slots[slot, :size].view(self.dtype).reshape(shape)
+
+    def close(self):
+        """Detaches from the ring, and frees it if this ring created it"""
+        # Views must be dropped before the memory can be closed
+        self.__headers = None
+        self.__slots = None
+        self.__shm.close()
+        if self.__owner:
+            self.__shm.unlink()
+
+
+def attach_shared_memory(name):
+    """Attaches to shared memory created by another process, which is responsible for freeing it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching always registers with the resource tracker.
+        # Worker processes share their parent's tracker, so this is harmless.
+        return shared_memory.SharedMemory(name=name)
+
+
+# The ring a worker process is attached to, and the detector it runs
+__worker_ring = None
+__worker_detector = None
+
+
+def attach_worker(num_slots, frame_shape, dtype, name, config=DetectorConfig()):
+    global __worker_ring, __worker_detector
+    __worker_ring = FrameRing(num_slots, frame_shape, dtype, name)
+    __worker_detector = Detector(config)
+
+
+def detect_slot(slot, text_mask=None):
+    # Runs directly on the shared frame, only the boxes are sent back
+    return __worker_detector.detect_boxes(__worker_ring.get_frame(slot), text_mask)
+
+
+class FramePool:
+    """Runs detection on worker processes, passing frames through a shared FrameRing.
+    submit() copies a frame into the ring, reserve() and commit() let the producer
+    write frames into the ring directly. Both block while every slot is in use.
+
+    Keyword Arguments:
+
+    frame_shape -- the largest frame shape that will be submitted
+    processes -- number of worker processes, defaults to the number of CPUs
+    num_slots -- number of frames in flight, defaults to twice the number of processes
+    dtype -- frame data type
+    config -- the DetectorConfig the workers detect with
+    """
+    def __init__(self, frame_shape, processes=None, num_slots=None, dtype=np.uint8, config=DetectorConfig()):
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if num_slots is None:
+            num_slots = 2 * processes
+
+        self.ring = FrameRing(num_slots, frame_shape, dtype)
+        self.__free_slots = queue.Queue()
+        for slot in range(num_slots):
+            self.__free_slots.put(slot)
+
+        self.__executor = ProcessPoolExecutor(processes, initializer=attach_worker,
+                                              initargs=self.ring.get_description() + (config,))
+
+    def reserve(self, shape=None, timeout=None):
+        """Takes a free slot for a frame, blocking while every slot is in use.
+        Returns the slot and a writable view of it in shared memory. Write the frame
+        into the view, e.g. with capture.read(frame), then pass the slot to commit(),
+        or to release() to give it back unused.
+
+        Keyword Arguments:
+
+        shape -- shape of the frame, defaults to the pool's frame_shape
+        timeout -- seconds to wait for a free slot, None waits forever
+        """
+        try:
+            slot = self.__free_slots.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No free frame slot") from None
+        try:
+            frame = self.ring.reserve(slot, shape)
+        except BaseException:
+            self.release(slot)
+            raise
+        return slot, frame
+
+    def commit(self, slot):
+        """Queues the frame written into a reserved slot for detection.
+        Returns a future of the detect_boxes array. The slot is freed once the future is done.
+        """
+        try:
+            future = self.__executor.submit(detect_slot, slot)
+        except BaseException:
+            self.release(slot)
+            raise
+        future.add_done_callback(lambda f: self.release(slot))
+        return future
+
+    def release(self, slot):
+        """Gives back a reserved slot without running detection on it"""
+        self.__free_slots.put(slot)
+
+    def submit(self, frame):
+        """Copies a frame into a free slot and queues it for detection. Returns a future of the detect_boxes array"""
+        slot, view = self.reserve(frame.shape)
+        try:
+            np.copyto(view, frame, casting="same_kind")
+        except BaseException:
+            self.release(slot)
+            raise
+        return self.commit(slot)
+
+    def map(self, frames):
+        """Yields the boxes of each frame in order, keeping the ring full"""
+        pending = collections.deque()
+        for frame in frames:
+            # Waiting on the oldest frame before the ring fills so submit() cannot deadlock
+            if len(pending) == self.ring.num_slots:
+                yield pending.popleft().result()
+            pending.append(self.submit(frame))
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        self.__executor.shutdown(wait=True)
+        self.ring.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
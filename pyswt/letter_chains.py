@@ -3,59 +3,193 @@ import copy
 import cv2
 import numpy as np
 
-from .connected_component import ConnectedComponentData
-from typing import List
+from .connected_component import ConnectedComponentData, get_median_stroke_widths
+from typing import List, NamedTuple
 
-__sw_median_max_ratio = 2
-__height_max_ratio = 1.5
-__max_chain_height = 150
-__max_distance_multiplier = 3
-__min_chain_size = 3
 
-__max_average_gray_diff = 3
-__gray_variance_coefficient = 1.25
+class ChainConfig(NamedTuple):
+    """Thresholds of the letter pair and chain filters"""
+    sw_median_max_ratio: float = 2
+    height_max_ratio: float = 1.5
+    max_chain_height: int = 150
+    max_distance_multiplier: float = 3
+    min_chain_size: int = 3
+    max_pair_area_ratio: float = 5
+    max_chain_height_to_width_ratio: float = 0.66
 
+    # Pairs used to be tested on their mean gray, but the cached value it read was
+    # the mean stroke width, so that is what filter_pairs compares
+    max_mean_stroke_width_diff: float = 3
+    gray_variance_coefficient: float = 1.25
 
-__max_char_width_to_heigh_ratio = 1
+    max_char_width_to_heigh_ratio: float = 1
+
+
+__default_config = ChainConfig()
 
 
 # Produce the final set of letter chains and get their bounding boxes
-def run(cc_data_filtered: List[ConnectedComponentData]):
-    chains = populate_pairs(cc_data_filtered)
-    # Get rid of chains if component height ratio > 2
-    chains = remove_if_pair_area_too_different(chains)
-    chains = remove_if_heights_too_different(chains)
-    chains = remove_if_grays_dissimilar(chains)
-    chains = remove_if_stroke_widths_too_different(chains)
+def run(cc_data_filtered: List[ConnectedComponentData], max_pairs=None, config: ChainConfig = __default_config):
+    """Pairs letter candidates up and joins the pairs into chains
+
+    Keyword Arguments:
+
+    cc_data_filtered -- components from filter_connected_components.run
+    max_pairs -- if set, at most this many of the closest letter pairs are chained
+    config -- the pair and chain thresholds
+    """
+    # Pairwise tests are done on arrays, chains are only built for surviving pairs
+    table = ComponentTable(cc_data_filtered)
+    first, second = populate_pair_indices(table, config)
+    keep = filter_pairs(table, first, second, config)
+    first = first[keep]
+    second = second[keep]
+    if max_pairs is not None and len(first) > max_pairs:
+        first, second = keep_closest_pairs(table, first, second, max_pairs)
+    chains = build_chains(table, first, second)
 
     # This is Daniel's idea, any it only works well for some images
     # chains = filter_by_chain_gray_variance(chains)
-    if len(chains) > 0:
-        __max_chain_height = max([chain.get_height() for chain in chains])
 
     chains = lengthen_chains(chains)
-    chains = remove_short_chains(chains)
-    chains = filter_chains_by_height(chains)
-    chains = filter_height_to_width_ratio(chains)
+    chains = remove_short_chains(chains, config)
+    chains = filter_chains_by_height(chains, config)
+    chains = filter_height_to_width_ratio(chains, config)
     # chains = filter_by_expected_width_given_height_and_num_components(chains)
 
     return chains
 
 
 # Check each pair of connected components and produce a tuple of sufficicently close letter candidates
-def populate_pairs(cc_data_filtered: List[ConnectedComponentData]):
-    # Only need to check each pair of elements once
-    chains = []
-    for i in range(len(cc_data_filtered)):
-        for j in range(i + 1, len(cc_data_filtered)):
-            # If the two components are close enough together, add them together in a chain
-            if is_within_relative_distance(cc_data_filtered[i], cc_data_filtered[j]):
-                chains.append(build_chain(cc_data_filtered[i], cc_data_filtered[j]))
+def populate_pairs(cc_data_filtered: List[ConnectedComponentData], config: ChainConfig = __default_config):
+    table = ComponentTable(cc_data_filtered)
+    first, second = populate_pair_indices(table, config)
+    return build_chains(table, first, second)
 
-    return chains
 
+class ComponentTable:
+    """Component attributes as arrays, indexed like the component list.
+    Per-component statistics are only calculated for components that are part of a pair.
+    """
+    def __init__(self, ccs: List[ConnectedComponentData]):
+        self.components = ccs
+
+        self.row_min = np.array([cc.row_min for cc in ccs], np.int64)
+        self.row_max = np.array([cc.row_max for cc in ccs], np.int64)
+        self.col_min = np.array([cc.col_min for cc in ccs], np.int64)
+        self.col_max = np.array([cc.col_max for cc in ccs], np.int64)
+        self.area = np.array([cc.area for cc in ccs], np.float64)
+
+        self.__mean_stroke_width = None
+        self.__median_stroke_width = None
+
+    def __len__(self):
+        return len(self.components)
+
+    def get_height(self):
+        return self.row_max - self.row_min
 
-def is_within_relative_distance(cc_1: ConnectedComponentData, cc_2: ConnectedComponentData):
+    def get_width(self):
+        return self.col_max - self.col_min
+
+    def get_mean_stroke_width(self, indices):
+        if self.__mean_stroke_width is None:
+            self.__mean_stroke_width = np.full(len(self), np.nan)
+        return self.__fill(self.__mean_stroke_width, indices, ConnectedComponentData.get_mean_stroke_width)
+
+    def get_median_stroke_width(self, indices):
+        if self.__median_stroke_width is None:
+            self.__median_stroke_width = np.full(len(self), np.nan)
+
+        # Medians of all components not seen yet are calculated in one call
+        missing = np.unique(indices[np.isnan(self.__median_stroke_width[indices])])
+        if len(missing) > 0:
+            self.__median_stroke_width[missing] = get_median_stroke_widths([self.components[i] for i in missing])
+        return self.__median_stroke_width[indices]
+
+    def __fill(self, values, indices, getter):
+        for i in np.unique(indices[np.isnan(values[indices])]):
+            values[i] = getter(self.components[i])
+        return values[indices]
+
+
+# Row-blocks are sized so that at most this many candidate pairs are held at once
+__max_pairs_per_block = 1 << 20
+
+
+def populate_pair_indices(table: ComponentTable, config: ChainConfig = __default_config):
+    """Returns index arrays (first, second), first < second, of the component pairs
+    that are within relative distance of each other, in the same order as the nested loop
+    """
+    n = len(table)
+    block_size = max(1, __max_pairs_per_block // max(n, 1))
+    firsts = [np.empty(0, np.int64)]
+    seconds = [np.empty(0, np.int64)]
+    for start in range(0, n, block_size):
+        i = np.arange(start, min(start + block_size, n))[:, None]
+        j = np.arange(n)[None, :]
+
+        # Ensure one letter candidate is not floating above the other
+        overlapping = (table.row_min[i] < table.row_max[j]) & (table.row_min[j] < table.row_max[i])
+        # Same distance as is_within_relative_distance
+        dist = np.sqrt((table.row_max[j] - table.row_max[i]) ** 2 + (table.col_min[j] - table.col_max[i]) ** 2)
+        largest_width = np.maximum(table.get_width()[i], table.get_width()[j])
+
+        pair_mask = (j > i) & overlapping & (dist <= largest_width * config.max_distance_multiplier)
+        block_first, block_second = np.nonzero(pair_mask)
+        firsts.append(block_first + start)
+        seconds.append(block_second)
+
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def filter_pairs(table: ComponentTable, first, second, config: ChainConfig = __default_config):
+    """Applies all pairwise tests at once and returns the mask of pairs to keep.
+    The pair area, height, mean stroke width and median stroke width must be similar.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        area_0 = table.area[first]
+        area_1 = table.area[second]
+        keep = (area_0 / area_1 <= config.max_pair_area_ratio) | (area_1 / area_0 <= config.max_pair_area_ratio)
+
+        # Get rid of chains if component height ratio > 2
+        height_0 = table.get_height()[first]
+        height_1 = table.get_height()[second]
+        keep &= (height_0 / height_1 <= config.height_max_ratio) | (height_1 / height_0 <= config.height_max_ratio)
+
+        # Mean stroke widths must differ by less than a fixed amount
+        candidates = np.nonzero(keep)[0]
+        mean_sw_0 = table.get_mean_stroke_width(first[candidates])
+        mean_sw_1 = table.get_mean_stroke_width(second[candidates])
+        keep[candidates] = np.abs(mean_sw_1 - mean_sw_0) < config.max_mean_stroke_width_diff
+
+        # see paper for reason for this magic number
+        candidates = np.nonzero(keep)[0]
+        sw_median_0 = table.get_median_stroke_width(first[candidates])
+        sw_median_1 = table.get_median_stroke_width(second[candidates])
+        keep[candidates] = (sw_median_0 / sw_median_1 <= config.sw_median_max_ratio) | \
+                           (sw_median_1 / sw_median_0 <= config.sw_median_max_ratio)
+
+    return keep
+
+
+def keep_closest_pairs(table: ComponentTable, first, second, max_pairs: int):
+    """Keeps the max_pairs pairs with the smallest relative distance, in their original order"""
+    dist = np.sqrt((table.row_max[second] - table.row_max[first]) ** 2
+                   + (table.col_min[second] - table.col_max[first]) ** 2)
+    largest_width = np.maximum(table.get_width()[first], table.get_width()[second])
+    keep = np.sort(np.argsort(dist / np.maximum(largest_width, 1), kind="stable")[:max_pairs])
+    return first[keep], second[keep]
+
+
+def build_chains(table: ComponentTable, first, second):
+    """Builds a two element chain for each (first, second) index pair"""
+    ccs = table.components
+    return [build_chain(ccs[i], ccs[j]) for i, j in zip(first.tolist(), second.tolist())]
+
+
+def is_within_relative_distance(cc_1: ConnectedComponentData, cc_2: ConnectedComponentData,
+                                config: ChainConfig = __default_config):
     # Ensure one letter candidate is not floating above the other
     if cc_1.row_min >= cc_2.row_max or cc_2.row_min >= cc_1.row_max:
         return False
@@ -63,7 +197,7 @@ def is_within_relative_distance(cc_1: ConnectedComponentData, cc_2: ConnectedCom
     # Euclidean distance
     dist = math.sqrt((cc_2.row_max - cc_1.row_max) ** 2 + (cc_2.col_min - cc_1.col_max) ** 2)
     largest_width = max(cc_1.col_max - cc_1.col_min, cc_2.col_max - cc_2.col_min)
-    return dist <= largest_width * __max_distance_multiplier
+    return dist <= largest_width * config.max_distance_multiplier
 
 
 class Chain:
@@ -91,6 +225,13 @@ class Chain:
     def get_width(self):
         return self.col_max - self.col_min
 
+    # Moves the chain bounds by the given offset, its components are moved separately
+    def translate(self, row_offset, col_offset):
+        self.row_min += row_offset
+        self.row_max += row_offset
+        self.col_min += col_offset
+        self.col_max += col_offset
+
 
 # python does not allow multiple constructors....
 def build_chain(cc_1: ConnectedComponentData, cc_2: ConnectedComponentData):
@@ -126,58 +267,10 @@ def merge_chains(c1: Chain, c2: Chain):
     return c1
 
 
-def remove_if_heights_too_different(chains: List[Chain]):
+def filter_height_to_width_ratio(chains: List[Chain], config: ChainConfig = __default_config):
     filtered_chains = []
     for chain in chains:
-        cc_0 = chain.chain[0]
-        cc_1 = chain.chain[1]
-        height_0 = cc_0.row_max - cc_0.row_min
-        height_1 = cc_1.row_max - cc_1.row_min
-        # heights are non-zero from the component filtering step
-        if height_0 / height_1 <= __height_max_ratio or height_1 / height_0 <= __height_max_ratio:
-            filtered_chains.append(chain)
-
-    return filtered_chains
-
-
-def remove_if_stroke_widths_too_different(chains: List[Chain]):
-    filtered_chains = []
-    for chain in chains:
-        sw_median_0 = chain.chain[0].get_median_stroke_width()
-        sw_median_1 = chain.chain[1].get_median_stroke_width()
-        # see paper for reason for this magic number
-        if sw_median_0 / sw_median_1 <= __sw_median_max_ratio or sw_median_1 / sw_median_0 <= __sw_median_max_ratio:
-            filtered_chains.append(chain)
-
-    return filtered_chains
-
-
-def filter_height_to_width_ratio(chains: List[Chain]):
-    filtered_chains = []
-    for chain in chains:
-        if chain.get_height()/chain.get_width() <= 0.66:
-            filtered_chains.append(chain)
-
-    return filtered_chains
-
-
-def remove_if_pair_area_too_different(chains: List[Chain]):
-    filtered_chains = []
-    for chain in chains:
-        cc_1 = chain.chain[0]
-        cc_2 = chain.chain[1]
-        if cc_1.area / cc_2.area <= 5 or cc_2.area / cc_1.area <= 5:
-            filtered_chains.append(chain)
-
-    return filtered_chains
-
-
-def remove_if_grays_dissimilar(chains: List[Chain]):
-    filtered_chains = []
-    for chain in chains:
-        avg_gray_0 = chain.chain[0].get_mean_gray()
-        avg_gray_1 = chain.chain[1].get_mean_gray()
-        if abs(avg_gray_1 - avg_gray_0) < __max_average_gray_diff:
+        if chain.get_height()/chain.get_width() <= config.max_chain_height_to_width_ratio:
             filtered_chains.append(chain)
 
     return filtered_chains
@@ -228,7 +321,7 @@ def lengthen_chains(chains: List[Chain]):
 
 
 # This is a function Daniel Herman thought would be good
-def filter_by_chain_gray_variance(chains: List[Chain]):
+def filter_by_chain_gray_variance(chains: List[Chain], config: ChainConfig = __default_config):
     filtered_chains = []
     gray_variances = []
     areas = []
@@ -255,7 +348,7 @@ def filter_by_chain_gray_variance(chains: List[Chain]):
         areas.append(area)
         print((variance_gray, area))
 
-    max_gray_variance = np.average(gray_variances)*__gray_variance_coefficient
+    max_gray_variance = np.average(gray_variances)*config.gray_variance_coefficient
     for i in range(len(chains)):
         # if gray_variances[i] <= max_gray_variance:
         if gray_variances[i]/areas[i] < 0.5:  # This might be a better filter?
@@ -264,38 +357,46 @@ def filter_by_chain_gray_variance(chains: List[Chain]):
     return filtered_chains
 
 
-def filter_chains_by_height(chains: List[Chain]):
+def filter_chains_by_height(chains: List[Chain], config: ChainConfig = __default_config):
     filtered_chains = []
     for chain in chains:
-        if chain.row_max - chain.row_min <= __max_chain_height:
+        if chain.row_max - chain.row_min <= config.max_chain_height:
             filtered_chains.append(chain)
 
     return filtered_chains
 
 
-def remove_short_chains(chains: List[Chain]):
+def remove_short_chains(chains: List[Chain], config: ChainConfig = __default_config):
     long_chains = []
     for chain in chains:
-        if len(chain.chain) >= __min_chain_size:
+        if len(chain.chain) >= config.min_chain_size:
             long_chains.append(chain)
 
     return long_chains
 
 
-def filter_by_expected_width_given_height_and_num_components(chains: List[Chain]):
+def filter_by_expected_width_given_height_and_num_components(chains: List[Chain],
+                                                             config: ChainConfig = __default_config):
     filtered_chains = []
     for chain in chains:
         num_cc = len(chain.chain)
-        expected_width_upperbound = num_cc * __max_char_width_to_heigh_ratio*chain.get_height()
+        expected_width_upperbound = num_cc * config.max_char_width_to_heigh_ratio*chain.get_height()
         if chain.get_width() <= expected_width_upperbound:
             filtered_chains.append(chain)
 
     return filtered_chains
 
 
+# Returns the bounding boxes as an array with rows [row_min, col_min, row_max, col_max]
+def get_bounding_boxes(chains: List[Chain]):
+    boxes = [[chain.row_min, chain.col_min, chain.row_max, chain.col_max] for chain in chains]
+    return np.array(boxes, np.int64).reshape(-1, 4)
+
+
 # Default color is red
-def make_image_with_bounding_boxes(img, chains: List[Chain], color=(0, 0, 255)):
-    img_drawn = copy.deepcopy(img)
+def make_image_with_bounding_boxes(img, chains: List[Chain], color=(0, 0, 255), in_place=False):
+    # Drawing in place skips copying the image
+    img_drawn = img if in_place else copy.deepcopy(img)
     for chain in chains:
         # Bounding-box top-left clockwise
         bb = chain.get_bounding_box()
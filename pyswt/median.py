@@ -0,0 +1,64 @@
+import numpy as np
+
+# Largest sort key, segment ids and value keys are combined into one int64 below this
+__max_combined_key = 1 << 62
+
+
+def segmented_median(values, offsets, keys=None):
+    """Returns the median of each segment values[offsets[i]:offsets[i + 1]] in one call.
+    Gives the same results as np.median on each segment, nan for empty segments.
+    Values must not be nan.
+
+    The values are ordered within their segments by a single integer sort, then the
+    middle elements of each segment are selected.
+
+    Keyword Arguments:
+
+    values -- the values of all segments stored end to end
+    offsets -- start of each segment in values, followed by the total length
+    keys -- optional non-negative integer sort keys for the values, see get_sort_keys
+    """
+    values = np.asarray(values, np.float64)
+    offsets = np.asarray(offsets, np.int64)
+    lengths = np.diff(offsets)
+    medians = np.full(len(lengths), np.nan)
+    if len(values) == 0:
+        return medians
+
+    if keys is None:
+        keys = get_sort_keys(values)
+    num_keys = int(keys.max()) + 1
+
+    # Sorting by segment, then by value, with one integer key
+    segments = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+    if len(lengths) * num_keys < __max_combined_key:
+        order = np.argsort(segments * num_keys + keys)
+    else:
+        order = np.lexsort((keys, segments))
+    sorted_values = values[order]
+
+    # Middle element of odd segments, mean of the two middle elements of even ones
+    filled = np.nonzero(lengths > 0)[0]
+    starts = offsets[filled]
+    lower = sorted_values[starts + (lengths[filled] - 1) // 2]
+    upper = sorted_values[starts + lengths[filled] // 2]
+    medians[filled] = (lower + upper) / 2
+    return medians
+
+
+def get_sort_keys(values):
+    """Returns non-negative integer keys ordered like the values, equal only for equal values.
+    Stroke widths are lengths of integer pixel offsets, so their squares are
+    integers and are used directly. Other values are ranked.
+    """
+    squares = np.rint(values * values)
+    if values.min() >= 0 and np.array_equal(np.sqrt(squares), values):
+        return squares.astype(np.int64)
+
+    return np.unique(values, return_inverse=True)[1].ravel().astype(np.int64)
+
+
+def median(values):
+    """Same as np.median for a 1D sequence of values"""
+    values = np.asarray(values, np.float64)
+    return segmented_median(values, [0, len(values)])[0]
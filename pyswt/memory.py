@@ -0,0 +1,154 @@
+import contextlib
+import math
+import threading
+import tracemalloc
+
+# Estimated traced peak bytes per image pixel of a full detection, used to pick a tile size.
+# It is an estimate, not a bound: the example images need 210 to 330, text-dense images
+# the most, and an image with more edges can need more.
+__peak_bytes_per_pixel = 400
+
+# Bytes per pixel tiles are sized for when a detection within the estimate still ran out of memory
+__retry_peak_bytes_per_pixel = 2 * __peak_bytes_per_pixel
+
+# Smallest tile side tiled processing goes down to
+__min_tile_size = 128
+
+
+class StageMemory:
+    """Memory use of one pipeline stage, the largest seen over all the times it ran"""
+    def __init__(self):
+        # Most bytes allocated at once while the stage ran, on top of what was allocated before it
+        self.peak_bytes = 0
+        # Bytes still allocated when the stage finished, i.e. its output
+        self.retained_bytes = 0
+        self.calls = 0
+
+
+class MemoryReport:
+    """Records peak and retained bytes of each pipeline stage, measured with tracemalloc,
+    and the amount of data the stages produced. Pass one to Detector.detect.
+    Allocations made inside compiled kernels are not traced, use the python backend
+    to see them.
+    tracemalloc is process-wide, so traced detections run one at a time, even with
+    different reports. Allocations of untraced work running in other threads at the
+    same time are still counted into the report.
+    """
+    # Held by the thread running a traced detection, see trace()
+    __trace_lock = threading.RLock()
+
+    def __init__(self):
+        # Stage name -> StageMemory, in the order the stages first ran
+        self.stages = {}
+        # Number of rays, stroke pixels, components and chains produced, summed over both polarities
+        self.counts = {}
+        # Most bytes allocated at once during detection
+        self.peak_bytes = 0
+
+        # Tiled processing is used when the image would not fit the memory limit
+        self.tiles = 1
+        self.tile_size = None
+
+        self.__depth = 0
+        self.__baseline = 0
+
+    @contextlib.contextmanager
+    def trace(self):
+        """Traces allocations until the with block exits, starting tracemalloc if needed.
+        Waits for traced detections running in other threads to finish first.
+        """
+        with self.__trace_lock:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            if self.__depth == 0:
+                self.__baseline = tracemalloc.get_traced_memory()[0]
+            self.__depth += 1
+            try:
+                yield self
+            finally:
+                self.__depth -= 1
+                if started:
+                    tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def track(self, stage):
+        """Records the memory used by the code in the with block as the given stage"""
+        with self.trace():
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            try:
+                yield
+            finally:
+                current, peak = tracemalloc.get_traced_memory()
+                stats = self.stages.setdefault(stage, StageMemory())
+                stats.peak_bytes = max(stats.peak_bytes, peak - before)
+                stats.retained_bytes = max(stats.retained_bytes, current - before)
+                stats.calls += 1
+                self.peak_bytes = max(self.peak_bytes, peak - self.__baseline)
+
+    def add_count(self, name, count):
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def count_components(self, components):
+        """Passes components through, counting them and their pixels"""
+        for cc in components:
+            self.add_count("components", 1)
+            self.add_count("component_pixels", cc.area)
+            yield cc
+
+    def to_dict(self):
+        return {
+            "peak_bytes": self.peak_bytes,
+            "tiles": self.tiles,
+            "tile_size": self.tile_size,
+            "stages": {name: {"peak_bytes": stats.peak_bytes, "retained_bytes": stats.retained_bytes,
+                              "calls": stats.calls}
+                       for name, stats in self.stages.items()},
+            "counts": dict(self.counts),
+        }
+
+    def __str__(self):
+        lines = ["{:<16}{:>14}{:>14}".format("stage", "peak bytes", "retained")]
+        for name, stats in self.stages.items():
+            lines.append("{:<16}{:>14}{:>14}".format(name, stats.peak_bytes, stats.retained_bytes))
+        lines.append("{:<16}{:>14}".format("total", self.peak_bytes))
+        lines.extend("{:<16}{:>14}".format(name, count) for name, count in self.counts.items())
+        return "\n".join(lines)
+
+
+def track(report, stage):
+    """report.track(stage), or nothing if report is None"""
+    if report is None:
+        return contextlib.nullcontext()
+    return report.track(stage)
+
+
+def estimate_peak_bytes(shape):
+    """Rough estimate of the memory a detection on an image of the given shape needs"""
+    return shape[0] * shape[1] * __peak_bytes_per_pixel
+
+
+def get_tile_size(shape, memory_limit):
+    """Returns the side of square tiles that keep detection within memory_limit bytes,
+    or None if the whole image fits. Raises ValueError if even the smallest tiles would not fit.
+    """
+    if estimate_peak_bytes(shape) <= memory_limit:
+        return None
+
+    min_tile_bytes = estimate_peak_bytes((min(shape[0], __min_tile_size), min(shape[1], __min_tile_size)))
+    if min_tile_bytes > memory_limit:
+        raise ValueError("Memory limit of " + str(memory_limit) + " bytes is below the estimated "
+                         + str(min_tile_bytes) + " bytes of the smallest tiles")
+    return max(__min_tile_size, int(math.sqrt(memory_limit / __peak_bytes_per_pixel)))
+
+
+def get_retry_tile_size(shape, memory_limit):
+    """Returns the side of square tiles to retry with after a detection that get_tile_size let run
+    whole ran out of memory. The tiles are sized for twice the estimated bytes per pixel, and are
+    at least the smallest tile size. Returns None if such tiles would cover the whole image.
+    """
+    tile_size = max(__min_tile_size, int(math.sqrt(memory_limit / __retry_peak_bytes_per_pixel)))
+    if tile_size >= max(shape[:2]):
+        return None
+    return tile_size
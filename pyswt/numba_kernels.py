@@ -0,0 +1,327 @@
+"""Numba compiled versions of the hot kernels.
+Importing this module raises ImportError if numba is not installed.
+Each kernel must give the same results as its reference implementation,
+this is checked by tests/test_backends.py.
+The kernels release the GIL, so detections on several threads run in parallel.
+"""
+import math
+import numba
+import numpy as np
+
+from . import backend
+
+__backend = "numba"
+
+__directions8 = np.array([[-1, 1], [0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0]], np.int64)
+__directions4 = np.array([[0, 1], [1, 0], [0, -1], [-1, 0]], np.int64)
+# Stands in for the region when rays are not limited to one
+__no_region = np.ones((1, 1), np.uint8)
+
+
+@numba.njit(cache=True, nogil=True)
+def check_index(index, size):
+    """Returns the index, or -1 where it lies outside the image"""
+    if index >= size or index < 0:
+        return -1
+    return index
+
+
+@numba.njit(cache=True, nogil=True)
+def magnitude(x, y):
+    return math.sqrt(x * x + y * y)
+
+
+@numba.njit(cache=True, nogil=True)
+def angle_between(x1, y1, x2, y2):
+    denominator = magnitude(x1, y1) * magnitude(x2, y2)
+    # The reference implementation gets nan for a zero vector, which never passes the angle test
+    if denominator == 0:
+        return math.nan
+    proportion = (x1 * x2 + y1 * y2) / denominator
+    if abs(proportion) > 1:
+        return math.pi / 2
+    return math.acos(proportion)
+
+
+@numba.njit(cache=True, nogil=True)
+def cast_rays_numba(gx, gy, edges, origin_rows, origin_cols, dir, max_angle_diff, region, use_region):
+    num_rows, num_cols = edges.shape
+    offsets = [0]
+    rows = [0]
+    cols = [0]
+    # Dropping the entries that fixed the list types
+    rows.pop()
+    cols.pop()
+    ray_rows = [0]
+    ray_cols = [0]
+
+    for k in range(len(origin_rows)):
+        row = origin_rows[k]
+        col = origin_cols[k]
+        g_row = gx[row, col] * dir
+        g_col = gy[row, col] * dir
+        # If we encounter an edge with no direction
+        if g_row == 0 and g_col == 0:
+            continue
+
+        g_col_norm = g_col / magnitude(g_col, g_row)
+        g_row_norm = g_row / magnitude(g_col, g_row)
+
+        ray_rows.clear()
+        ray_cols.clear()
+        ray_rows.append(row)
+        ray_cols.append(col)
+        found = False
+        i = 1
+        while True:
+            col_step = math.floor(col + 0.5 + g_col_norm * i)
+            row_step = math.floor(row + 0.5 + g_row_norm * i)
+            i += 1
+            r = check_index(row_step, num_rows)
+            c = check_index(col_step, num_cols)
+            if r < 0 or c < 0:
+                break
+            if use_region and region[r, c] == 0:
+                break
+            if edges[r, c] > 0:
+                g_opp_row = gx[r, c] * dir
+                g_opp_col = gy[r, c] * dir
+                theta = angle_between(g_row_norm, g_col_norm, -g_opp_row, -g_opp_col)
+                found = theta < max_angle_diff
+                break
+            ray_rows.append(row_step)
+            ray_cols.append(col_step)
+
+        if found:
+            for j in range(len(ray_rows)):
+                rows.append(ray_rows[j])
+                cols.append(ray_cols[j])
+            offsets.append(len(rows))
+
+    return np.array(offsets, np.int64), np.array(rows, np.int64), np.array(cols, np.int64)
+
+
+def as_uint8(img):
+    # Boolean images are viewed as bytes instead of copied
+    return img.view(np.uint8) if img.dtype == np.bool_ else img.astype(np.uint8, copy=False)
+
+
+@backend.register_kernel("cast_rays", __backend)
+def cast_rays(gx, gy, edges, origin_rows, origin_cols, dir, max_angle_diff, region=None):
+    use_region = region is not None
+    if not use_region:
+        region = __no_region
+    return cast_rays_numba(gx, gy, edges, origin_rows.astype(np.int64), origin_cols.astype(np.int64),
+                           float(dir), float(max_angle_diff), as_uint8(region), use_region)
+
+
+@numba.njit(cache=True, nogil=True)
+def fill_stroke_widths_numba(swt_img, offsets, rows, cols):
+    num_rows, num_cols = swt_img.shape
+    swt_img[:] = np.inf
+    for i in range(len(offsets) - 1):
+        start = offsets[i]
+        end = offsets[i + 1]
+        width = magnitude(float(rows[end - 1] - rows[start]), float(cols[end - 1] - cols[start]))
+        for j in range(start, end):
+            if swt_img[rows[j], cols[j]] > width:
+                swt_img[rows[j], cols[j]] = width
+
+    for r in range(num_rows):
+        for c in range(num_cols):
+            if swt_img[r, c] == np.inf:
+                swt_img[r, c] = 0
+    return swt_img
+
+
+@backend.register_kernel("fill_stroke_widths", __backend)
+def fill_stroke_widths(shape, offsets, rows, cols):
+    return fill_stroke_widths_numba(np.empty(shape), offsets, rows, cols)
+
+
+@numba.njit(cache=True, nogil=True)
+def apply_ray_medians_numba(swt_img, offsets, rows, cols):
+    swt_median = swt_img.copy()
+    for i in range(len(offsets) - 1):
+        start = offsets[i]
+        end = offsets[i + 1]
+        values = np.empty(end - start)
+        for j in range(start, end):
+            values[j - start] = swt_img[rows[j], cols[j]]
+        median = np.median(values)
+        for j in range(start, end):
+            if swt_img[rows[j], cols[j]] > median:
+                swt_median[rows[j], cols[j]] = median
+    return swt_median
+
+
+@backend.register_kernel("apply_ray_medians", __backend)
+def apply_ray_medians(swt_img, offsets, rows, cols):
+    return apply_ray_medians_numba(swt_img, offsets, rows, cols)
+
+
+@numba.njit(cache=True, nogil=True)
+def get_ray_medians_numba(values, offsets):
+    medians = np.empty(len(offsets) - 1)
+    for i in range(len(offsets) - 1):
+        medians[i] = np.median(values[offsets[i]:offsets[i + 1]])
+    return medians
+
+
+@backend.register_kernel("ray_medians", __backend)
+def get_ray_medians(values, offsets):
+    return get_ray_medians_numba(values, offsets)
+
+
+@numba.njit(cache=True, nogil=True)
+def grow_region_numba(gray_img, pixel_source, component_image, label, row, col, directions, max_ratio):
+    num_rows, num_cols = pixel_source.shape
+    rows = [row]
+    cols = [col]
+    initial_stroke_width = pixel_source[row, col]
+    stroke_widths = [initial_stroke_width]
+    grays = [gray_img[row, col]]
+    pixel_source[row, col] = 0
+    component_image[row, col] = label
+
+    # Pixels waiting to be grown from
+    stack_rows = [row]
+    stack_cols = [col]
+    stack_widths = [initial_stroke_width]
+    stack_rows.pop()
+    stack_cols.pop()
+    stack_widths.pop()
+
+    # Initialize stack
+    for d in range(len(directions)):
+        row_shift = row + directions[d, 0]
+        col_shift = col + directions[d, 1]
+        r = check_index(row_shift, num_rows)
+        c = check_index(col_shift, num_cols)
+        if r < 0 or c < 0:
+            continue
+        adj_value = pixel_source[r, c]
+        if adj_value > 0:
+            if initial_stroke_width / adj_value < max_ratio and adj_value / initial_stroke_width < max_ratio:
+                rows.append(row_shift)
+                cols.append(col_shift)
+                stroke_widths.append(adj_value)
+                # The reference implementation records the seed's gray here
+                grays.append(gray_img[row, col])
+                pixel_source[r, c] = 0
+                component_image[r, c] = label
+                stack_rows.append(row_shift)
+                stack_cols.append(col_shift)
+                stack_widths.append(adj_value)
+
+    while len(stack_rows) > 0:
+        curr_row = stack_rows.pop()
+        curr_col = stack_cols.pop()
+        curr_width = stack_widths.pop()
+        for d in range(len(directions)):
+            row_shift = curr_row + directions[d, 0]
+            col_shift = curr_col + directions[d, 1]
+            r = check_index(row_shift, num_rows)
+            c = check_index(col_shift, num_cols)
+            if r < 0 or c < 0:
+                continue
+            adj_value = pixel_source[r, c]
+            if adj_value > 0:
+                if curr_width / adj_value < max_ratio and curr_width / initial_stroke_width < max_ratio:
+                    rows.append(row_shift)
+                    cols.append(col_shift)
+                    stroke_widths.append(adj_value)
+                    grays.append(gray_img[r, c])
+                    pixel_source[r, c] = 0
+                    component_image[r, c] = label
+                    stack_rows.append(row_shift)
+                    stack_cols.append(col_shift)
+                    stack_widths.append(adj_value)
+
+    return np.array(rows, np.int64), np.array(cols, np.int64), np.array(stroke_widths), np.array(grays)
+
+
+@backend.register_kernel("region_grow", __backend)
+def grow_region(gray_img, pixel_source, component_image, label, row, col, connect8, max_ratio):
+    directions = __directions8 if connect8 else __directions4
+    return grow_region_numba(gray_img, pixel_source, component_image, float(label), int(row), int(col),
+                             directions, float(max_ratio))
+
+
+@numba.njit(cache=True, nogil=True)
+def grow_region_sparse_numba(gray_img, neighbours, pixel_source, labels, row, col, label, seed, directions,
+                             max_ratio):
+    initial_stroke_width = pixel_source[seed]
+    pixel_source[seed] = 0
+    labels[seed] = label
+
+    rows = [row]
+    cols = [col]
+    stroke_widths = [initial_stroke_width]
+    grays = [gray_img[row, col]]
+
+    stack_rows = [row]
+    stack_cols = [col]
+    stack_widths = [initial_stroke_width]
+    stack_indices = [seed]
+    stack_rows.pop()
+    stack_cols.pop()
+    stack_widths.pop()
+    stack_indices.pop()
+
+    for d in range(len(directions)):
+        row_shift = row + directions[d, 0]
+        col_shift = col + directions[d, 1]
+        index = neighbours[seed, d]
+        if index < 0:
+            continue
+        adj_value = pixel_source[index]
+        if adj_value > 0:
+            if initial_stroke_width / adj_value < max_ratio and adj_value / initial_stroke_width < max_ratio:
+                rows.append(row_shift)
+                cols.append(col_shift)
+                stroke_widths.append(adj_value)
+                grays.append(gray_img[row, col])
+                pixel_source[index] = 0
+                labels[index] = label
+                stack_rows.append(row_shift)
+                stack_cols.append(col_shift)
+                stack_widths.append(adj_value)
+                stack_indices.append(index)
+
+    while len(stack_rows) > 0:
+        curr_row = stack_rows.pop()
+        curr_col = stack_cols.pop()
+        curr_width = stack_widths.pop()
+        curr_index = stack_indices.pop()
+        for d in range(len(directions)):
+            row_shift = curr_row + directions[d, 0]
+            col_shift = curr_col + directions[d, 1]
+            index = neighbours[curr_index, d]
+            if index < 0:
+                continue
+            adj_value = pixel_source[index]
+            if adj_value > 0:
+                if curr_width / adj_value < max_ratio and curr_width / initial_stroke_width < max_ratio:
+                    rows.append(row_shift)
+                    cols.append(col_shift)
+                    stroke_widths.append(adj_value)
+                    grays.append(gray_img[row_shift, col_shift])
+                    pixel_source[index] = 0
+                    labels[index] = label
+                    stack_rows.append(row_shift)
+                    stack_cols.append(col_shift)
+                    stack_widths.append(adj_value)
+                    stack_indices.append(index)
+
+    return np.array(rows, np.int64), np.array(cols, np.int64), np.array(stroke_widths), np.array(grays)
+
+
+@backend.register_kernel("region_grow_sparse", __backend)
+def grow_region_sparse(gray_img, keys, neighbours, pixel_source, labels, shape, label, seed, connect8, max_ratio):
+    directions = __directions8 if connect8 else __directions4
+    row = int(keys[seed] // shape[1])
+    col = int(keys[seed] % shape[1])
+    return grow_region_sparse_numba(gray_img, neighbours, pixel_source, labels, row, col, float(label), int(seed),
+                                    directions, float(max_ratio))
+
@@ -0,0 +1,180 @@
+import csv
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from . import letter_chains
+
+# Names and overlay colors of the chains returned by pyswt.detect, in order
+__polarities = ["light", "dark"]
+__colors = [(0, 0, 255), (255, 0, 0)]
+
+
+def draw_boxes(img, chains_light_dark, in_place=True):
+    """Draws light text boxes in red and dark text boxes in blue, in a single pass.
+
+    Keyword Arguments:
+
+    img -- the image to draw on
+    chains_light_dark -- the chains returned by pyswt.detect
+    in_place -- draw on img itself instead of a copy
+    """
+    img_drawn = img if in_place else img.copy()
+    for chains, color in zip(chains_light_dark, __colors):
+        letter_chains.make_image_with_bounding_boxes(img_drawn, chains, color, True)
+    return img_drawn
+
+
+def get_box_records(name, chains_light_dark):
+    """Returns one dict per box, with the image name and text polarity"""
+    records = []
+    for chains, polarity in zip(chains_light_dark, __polarities):
+        for box in letter_chains.get_bounding_boxes(chains).tolist():
+            records.append({
+                "image": name,
+                "polarity": polarity,
+                "row_min": box[0],
+                "col_min": box[1],
+                "row_max": box[2],
+                "col_max": box[3]
+            })
+    return records
+
+
+class BoxWriter:
+    """Streams box records to a JSONL or CSV file from a background thread.
+    Records are written in the order they were submitted.
+
+    Keyword Arguments:
+
+    path -- the file to write, the format is taken from the .jsonl or .csv extension
+    max_pending -- number of images that can be queued before write() blocks
+    """
+    __fields = ["image", "polarity", "row_min", "col_min", "row_max", "col_max"]
+    # The file is flushed after this many images
+    __flush_interval = 64
+
+    def __init__(self, path, max_pending=256):
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in [".jsonl", ".csv"]:
+            raise ValueError("Box files must be .jsonl or .csv: " + path)
+
+        self.path = path
+        self.__file = open(path, "w", newline="")
+        self.__csv = None
+        if ext == ".csv":
+            self.__csv = csv.DictWriter(self.__file, self.__fields)
+            self.__csv.writeheader()
+
+        self.__queue = queue.Queue(max_pending)
+        self.__error = None
+        self.__thread = threading.Thread(target=self.__work, name="pyswt-box-writer", daemon=True)
+        self.__thread.start()
+
+    def write(self, name, chains_light_dark):
+        """Queues the boxes of one image for writing"""
+        self.__raise_error()
+        self.__queue.put(get_box_records(name, chains_light_dark))
+
+    def close(self):
+        """Writes all queued boxes and closes the file"""
+        if self.__thread.is_alive():
+            self.__queue.put(None)
+            self.__thread.join()
+        self.__file.close()
+        self.__raise_error()
+
+    def __work(self):
+        written = 0
+        while True:
+            records = self.__queue.get()
+            if records is None:
+                break
+            if self.__error is not None:
+                continue
+            try:
+                for record in records:
+                    if self.__csv is not None:
+                        self.__csv.writerow(record)
+                    else:
+                        self.__file.write(json.dumps(record) + "\n")
+                written += 1
+                if written % self.__flush_interval == 0:
+                    self.__file.flush()
+            except Exception as e:
+                self.__error = e
+        self.__file.flush()
+
+    def __raise_error(self):
+        if self.__error is not None:
+            raise self.__error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class OverlayWriter:
+    """Draws boxes onto images and encodes them to disk on background threads.
+
+    Keyword Arguments:
+
+    directory -- directory the overlays are written to, created if missing
+    ext -- image format extension passed to cv2.imwrite
+    workers -- number of encoding threads
+    max_pending -- number of images that can be in flight before write() blocks
+    """
+    def __init__(self, directory, ext=".png", workers=2, max_pending=8):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.directory = directory
+        self.ext = ext
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pyswt-overlay")
+        # Bounds the number of images held in memory by queued encodes
+        self.__slots = threading.BoundedSemaphore(max_pending)
+        self.__error = None
+
+    def write(self, name, img, chains_light_dark, copy=False):
+        """Queues an overlay of the boxes on img for writing to <directory>/<name><ext>.
+        Unless copy is True, img is drawn on in place and must not be used by the caller afterwards.
+        """
+        self.__raise_error()
+        if copy:
+            img = img.copy()
+        path = os.path.join(self.directory, name + self.ext)
+
+        self.__slots.acquire()
+        future = self.__executor.submit(self.__encode, path, img, chains_light_dark)
+        future.add_done_callback(self.__done)
+
+    def close(self):
+        """Waits for all queued overlays to be written"""
+        self.__executor.shutdown(wait=True)
+        self.__raise_error()
+
+    def __encode(self, path, img, chains_light_dark):
+        draw_boxes(img, chains_light_dark)
+        if not cv2.imwrite(path, img):
+            raise IOError("Could not write overlay: " + path)
+
+    def __done(self, future):
+        self.__slots.release()
+        if future.exception() is not None and self.__error is None:
+            self.__error = future.exception()
+
+    def __raise_error(self):
+        if self.__error is not None:
+            raise self.__error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
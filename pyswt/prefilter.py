@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+from . import swt
+
+# Tiles are square, in pixels
+__tile_size = 32
+
+# Minimum fraction of edge pixels in a tile for it to possibly contain text
+__min_edge_density = 0.02
+
+# Text strokes run in several directions, so a text tile should have edges in
+# at least this many of the orientation bins
+__num_orientation_bins = 4
+__min_orientation_bins = 2
+# Fraction of a tile's edge pixels a bin needs to count as present
+__min_orientation_bin_fraction = 0.1
+
+# Number of tiles to grow passing regions by, so strokes crossing tile borders are kept
+__dilation = 1
+
+
+def run(img, tile_size=__tile_size, min_edge_density=__min_edge_density,
+        min_orientation_bins=__min_orientation_bins, dilation=__dilation):
+    """Cheap text-likelihood test over a grid of tiles.
+    Uses integral images of edge and gradient orientation counts to reject
+    tiles that cannot contain text, e.g. sky, blank paper or walls.
+
+    Keyword Arguments:
+
+    img -- the image to test, either BGR or grayscale
+    tile_size -- width and height of the square tiles in pixels
+    min_edge_density -- minimum fraction of edge pixels in a passing tile
+    min_orientation_bins -- minimum number of distinct edge orientations in a passing tile
+    dilation -- number of tiles to grow the passing tiles by
+    """
+    if img.ndim == 3:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = img
+
+    # Same edge and gradient operators as the SWT itself
+    edges, gx, gy = swt.get_edges_and_gradients(gray)
+    return run_on_gradients(edges, gx, gy, tile_size, min_edge_density, min_orientation_bins, dilation)
+
+
+def run_on_gradients(edges, gx, gy, tile_size=__tile_size, min_edge_density=__min_edge_density,
+                     min_orientation_bins=__min_orientation_bins, dilation=__dilation):
+    """Same as run(), for edges and gradients already computed with swt.get_edges_and_gradients"""
+    edges = edges > 0
+    shape = edges.shape
+
+    row_bounds = np.append(np.arange(0, shape[0], tile_size), shape[0])
+    col_bounds = np.append(np.arange(0, shape[1], tile_size), shape[1])
+    tile_areas = np.outer(np.diff(row_bounds), np.diff(col_bounds))
+
+    edge_counts = tile_sums(edges, row_bounds, col_bounds)
+    edge_density = edge_counts / tile_areas
+
+    # Orientation of the gradient, folded to [0, pi) so light and dark text agree.
+    # Only needed on edge pixels, the other pixels keep bin -1 and are never counted.
+    edge_rows, edge_cols = np.nonzero(edges)
+    orientation = np.arctan2(gx[edge_rows, edge_cols], gy[edge_rows, edge_cols]) % np.pi
+    orientation_bin = np.full(shape, -1, np.int8)
+    orientation_bin[edge_rows, edge_cols] = np.minimum((orientation / np.pi * __num_orientation_bins).astype(np.int8),
+                                                       __num_orientation_bins - 1)
+    bins_present = np.zeros(edge_counts.shape, np.int32)
+    for b in range(__num_orientation_bins):
+        bin_counts = tile_sums(orientation_bin == b, row_bounds, col_bounds)
+        bins_present += bin_counts >= np.maximum(edge_counts * __min_orientation_bin_fraction, 1)
+
+    tile_mask = (edge_density >= min_edge_density) & (bins_present >= min_orientation_bins)
+    if dilation > 0:
+        kernel = np.ones((2 * dilation + 1, 2 * dilation + 1), np.uint8)
+        tile_mask = cv2.dilate(tile_mask.astype(np.uint8), kernel) > 0
+
+    return PrefilterResult(tile_mask, edge_density, tile_size, shape)
+
+
+def tile_sums(mask, row_bounds, col_bounds):
+    """Sums a binary mask over each tile using its integral image"""
+    integral = cv2.integral(mask.astype(np.uint8))
+    return (integral[row_bounds[1:], :][:, col_bounds[1:]]
+            - integral[row_bounds[:-1], :][:, col_bounds[1:]]
+            - integral[row_bounds[1:], :][:, col_bounds[:-1]]
+            + integral[row_bounds[:-1], :][:, col_bounds[:-1]])
+
+
+class PrefilterResult:
+    """Holds the tiles that passed the prefilter"""
+    def __init__(self, tile_mask, edge_density, tile_size, shape):
+        self.tile_mask = tile_mask
+        self.edge_density = edge_density
+        self.tile_size = tile_size
+        self.shape = shape
+
+        self.__mask = None
+
+    # Fraction of the image area that SWT can skip
+    def get_skipped_fraction(self):
+        return 1 - np.count_nonzero(self.get_mask()) / self.get_mask().size
+
+    # Pixel mask of the image, True where rays may be cast
+    def get_mask(self):
+        if self.__mask is None:
+            mask = np.repeat(np.repeat(self.tile_mask, self.tile_size, axis=0), self.tile_size, axis=1)
+            self.__mask = mask[:self.shape[0], :self.shape[1]]
+        return self.__mask
@@ -0,0 +1,341 @@
+import collections
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from .__main__ import detect_boxes
+
+
+class StreamScheduler:
+    """Multiplexes many frame sources onto a fixed pool of detection workers.
+    Each stream only ever has its newest frame waiting, older frames are dropped.
+    When more streams are ready than there are free workers, each stream gets frames
+    in proportion to its priority. Streams that miss their latency budget are
+    processed at a coarser scale.
+
+    Keyword Arguments:
+
+    workers -- number of frames processed at once, defaults to the number of CPUs
+    executor -- thread-based concurrent.futures executor to run detections on, a thread pool is
+                created if None. Process pools are rejected, the workers share the scheduler's
+                state. To detect on other processes, call a FramePool from detect_func.
+    detect_func -- callable returning a detect_boxes style array for a frame
+    on_result -- called as on_result(stream_name, frame_index, boxes) from a worker thread.
+                 Boxes are in the coordinates of the original frame.
+
+    A stream whose source raises ends, and the exception is kept as its "error" stat.
+    Exceptions raised by detect_func or on_result are kept the same way, and the
+    stream carries on with its next frame.
+    """
+    # Downscale factors a stream can step through when it falls behind
+    __default_scales = (1, 1.5, 2, 3, 4)
+
+    def __init__(self, workers=None, executor=None, detect_func=detect_boxes, on_result=None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if isinstance(executor, ProcessPoolExecutor):
+            raise ValueError("StreamScheduler needs a thread-based executor, not a process pool")
+
+        self.workers = workers
+        self.detect_func = detect_func
+        self.on_result = on_result
+
+        self.__owns_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pyswt-stream")
+        self.__executor = executor
+
+        self.__streams = collections.OrderedDict()
+        self.__condition = threading.Condition()
+        self.__in_flight = 0
+        # Start tag of the last frame dispatched, see __pick_stream
+        self.__virtual_time = 0
+        self.__running = False
+        self.__dispatcher = None
+
+    def add_stream(self, name, source, target_fps=None, latency_budget=None, priority=1, scales=__default_scales):
+        """Adds a frame source.
+
+        Keyword Arguments:
+
+        name -- unique name of the stream
+        source -- a cv2.VideoCapture-like object with read(), an iterable of frames,
+                  or a callable returning the next frame, None ends the stream
+        target_fps -- maximum rate frames are processed at, None processes as fast as possible
+        latency_budget -- seconds from reading a frame to its result before the stream is downscaled
+        priority -- relative share of the workers the stream gets when they are contended,
+                    a stream of priority 2 gets twice the frames of one with priority 1
+        scales -- downscale factors to step through, finest first
+        """
+        if priority <= 0:
+            raise ValueError("priority must be positive")
+        with self.__condition:
+            if name in self.__streams:
+                raise ValueError("Stream already added: " + str(name))
+            stream = Stream(name, get_reader(source), target_fps, latency_budget, priority, scales)
+            self.__streams[name] = stream
+            if self.__running:
+                self.__start_reader(stream)
+
+    def start(self):
+        """Starts reading all streams and dispatching frames"""
+        with self.__condition:
+            if self.__running:
+                return
+            self.__running = True
+            for stream in self.__streams.values():
+                self.__start_reader(stream)
+        self.__dispatcher = threading.Thread(target=self.__dispatch, name="pyswt-dispatcher", daemon=True)
+        self.__dispatcher.start()
+
+    def stop(self, wait=True):
+        """Stops reading and dispatching, then waits for frames being processed"""
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify_all()
+        if self.__dispatcher is not None:
+            self.__dispatcher.join()
+        for stream in self.__streams.values():
+            if stream.thread is not None:
+                stream.thread.join()
+        if self.__owns_executor:
+            self.__executor.shutdown(wait=wait)
+
+    def wait(self):
+        """Blocks until every stream has ended and all frames have been processed"""
+        with self.__condition:
+            while self.__running and not self.__is_finished():
+                self.__condition.wait()
+
+    def get_stats(self):
+        """Returns a dict of throughput and latency stats for each stream"""
+        with self.__condition:
+            return {name: stream.get_stats() for name, stream in self.__streams.items()}
+
+    def __start_reader(self, stream):
+        stream.thread = threading.Thread(target=self.__read, args=(stream,), name="pyswt-read-" + str(stream.name),
+                                         daemon=True)
+        stream.thread.start()
+
+    def __read(self, stream):
+        while True:
+            error = None
+            try:
+                frame = stream.read()
+            except Exception as e:
+                frame = None
+                error = e
+            with self.__condition:
+                if not self.__running:
+                    return
+                if frame is None:
+                    # A failing source ends its stream, the other streams carry on
+                    if error is not None:
+                        stream.error = error
+                    stream.ended = True
+                    self.__condition.notify_all()
+                    return
+                if stream.frame is not None:
+                    # Newer frame replaces one that was never processed
+                    stream.frames_dropped += 1
+                stream.frame = frame
+                stream.frame_index = stream.frames_read
+                stream.frame_time = time.monotonic()
+                stream.frames_read += 1
+                self.__condition.notify_all()
+
+    def __dispatch(self):
+        with self.__condition:
+            while self.__running:
+                now = time.monotonic()
+                stream = None
+                if self.__in_flight < self.workers:
+                    stream = self.__pick_stream(now)
+
+                if stream is None:
+                    # Sleep until a frame arrives, a worker frees up, or the next stream is due
+                    self.__condition.wait(self.__time_to_next_due(now))
+                    continue
+
+                frame = stream.frame
+                frame_index = stream.frame_index
+                frame_time = stream.frame_time
+                stream.frame = None
+                stream.busy = True
+                stream.last_dispatch = now
+                self.__virtual_time = self.__get_start_tag(stream)
+                stream.virtual_time = self.__virtual_time + 1 / stream.priority
+                self.__in_flight += 1
+                try:
+                    future = self.__executor.submit(self.__process, stream, frame, frame_index, frame_time,
+                                                    stream.get_scale())
+                except Exception as e:
+                    # The executor was shut down underneath the scheduler
+                    stream.error = e
+                    self.__finish(stream)
+                    continue
+                future.add_done_callback(lambda f, stream=stream: self.__done(stream, f))
+
+    def __pick_stream(self, now):
+        """Picks the ready stream with the smallest start tag, as in start-time fair queuing.
+        Each frame moves a stream's tag on by 1 / priority, so contended streams get frames
+        in proportion to their priority. Of equal tags, the most overdue stream weighted by
+        priority goes first, which is a stream with a target fps that has just become due.
+        """
+        best = None
+        best_key = None
+        for stream in self.__streams.values():
+            if stream.busy or stream.frame is None or stream.get_next_due() > now:
+                continue
+            # How long the stream has had a frame that was due
+            ready_since = max(stream.get_next_due(), stream.frame_time)
+            key = (self.__get_start_tag(stream), -stream.priority * (now - ready_since + 1e-3))
+            if best is None or key < best_key:
+                best = stream
+                best_key = key
+        return best
+
+    def __get_start_tag(self, stream):
+        # Streams that were idle or not due start from the current virtual time, without credit for the wait
+        return max(stream.virtual_time, self.__virtual_time)
+
+    def __time_to_next_due(self, now):
+        waits = [s.get_next_due() - now for s in self.__streams.values()
+                 if not s.busy and s.frame is not None and s.get_next_due() > now]
+        return min(waits) if len(waits) > 0 else None
+
+    def __process(self, stream, frame, frame_index, frame_time, scale):
+        try:
+            if scale != 1:
+                frame = cv2.resize(frame, (math.floor(frame.shape[1] / scale), math.floor(frame.shape[0] / scale)),
+                                   interpolation=cv2.INTER_LINEAR)
+            boxes = self.detect_func(frame)
+            if scale != 1:
+                boxes = boxes.copy()
+                boxes[:, :4] = np.floor(boxes[:, :4] * scale)
+        finally:
+            with self.__condition:
+                stream.record(time.monotonic() - frame_time, time.monotonic())
+
+        if self.on_result is not None:
+            self.on_result(stream.name, frame_index, boxes)
+
+    def __done(self, stream, future):
+        """Frees the stream's worker once its frame is done, keeping any exception raised on the way"""
+        with self.__condition:
+            if not future.cancelled() and future.exception() is not None:
+                stream.error = future.exception()
+            self.__finish(stream)
+
+    def __finish(self, stream):
+        stream.busy = False
+        self.__in_flight -= 1
+        self.__condition.notify_all()
+
+    def __is_finished(self):
+        return self.__in_flight == 0 and all(s.ended and s.frame is None for s in self.__streams.values())
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class Stream:
+    """Per-stream state of the scheduler"""
+    # A stream steps back to a finer scale when its latency is below this fraction of its budget
+    __scale_up_fraction = 0.5
+
+    # Number of recent frames latency and throughput stats are calculated over
+    __stats_window = 100
+
+    def __init__(self, name, read, target_fps, latency_budget, priority, scales):
+        self.name = name
+        self.read = read
+        self.target_fps = target_fps
+        self.latency_budget = latency_budget
+        self.priority = priority
+        self.scales = list(scales)
+        self.scale_index = 0
+
+        self.thread = None
+        self.ended = False
+        self.error = None
+
+        # Newest frame waiting to be processed
+        self.frame = None
+        self.frame_index = -1
+        self.frame_time = None
+        self.busy = False
+        self.last_dispatch = None
+        # Virtual time the stream's next frame may start at, see StreamScheduler.__pick_stream
+        self.virtual_time = 0
+
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+        self.latencies = collections.deque(maxlen=self.__stats_window)
+        self.completion_times = collections.deque(maxlen=self.__stats_window)
+
+    def get_scale(self):
+        return self.scales[self.scale_index]
+
+    # Earliest time the stream's next frame may be dispatched
+    def get_next_due(self):
+        if self.target_fps is None or self.last_dispatch is None:
+            return 0
+        return self.last_dispatch + 1 / self.target_fps
+
+    def record(self, latency, completion_time):
+        self.frames_processed += 1
+        self.latencies.append(latency)
+        self.completion_times.append(completion_time)
+
+        # Adapting the scale to the latency budget
+        if self.latency_budget is not None:
+            if latency > self.latency_budget and self.scale_index < len(self.scales) - 1:
+                self.scale_index += 1
+            elif latency < self.latency_budget * self.__scale_up_fraction and self.scale_index > 0:
+                self.scale_index -= 1
+
+    def get_stats(self):
+        latencies = np.array(self.latencies)
+        fps = 0
+        if len(self.completion_times) > 1:
+            elapsed = self.completion_times[-1] - self.completion_times[0]
+            if elapsed > 0:
+                fps = (len(self.completion_times) - 1) / elapsed
+
+        return {
+            "frames_read": self.frames_read,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "fps": fps,
+            "latency_mean": float(latencies.mean()) if len(latencies) > 0 else None,
+            "latency_p95": float(np.percentile(latencies, 95)) if len(latencies) > 0 else None,
+            "scale": self.get_scale(),
+            "ended": self.ended,
+            "error": self.error
+        }
+
+
+def get_reader(source):
+    """Returns a function reading the next frame from source, or None once it has ended"""
+    if hasattr(source, "read"):
+        def read():
+            ret, frame = source.read()
+            return frame if ret else None
+        return read
+
+    if callable(source):
+        return source
+
+    iterator = iter(source)
+    return lambda: next(iterator, None)
@@ -2,13 +2,119 @@ import cv2
 import numpy as np
 import math
 import copy
+from . import backend
 from . import cast_ray as cr
+from . import median
 
-def run(img, gradient_direction):
-    """Applies the SWT to the input image"""
+# Low and high hysteresis thresholds of the Canny edge detector
+__canny_thresholds = (100, 300)
+
+def run(img, gradient_direction, mask=None):
+    """Applies the SWT to the input image
+
+    Keyword Arguments:
+
+    img -- grayscale image to apply the SWT on
+    gradient_direction -- either 1 (light text) or -1 (dark text)
+    mask -- optional boolean image, rays are only cast from edges where it is True
+            and are dropped when they leave it
+    """
+
+    edges, gx, gy = get_edges_and_gradients(img)
+
+    # Rays start on edges, optionally restricted to the masked area.
+    # Rays still stop on any edge, masked or not.
+    origins = edges > 0
+    if mask is not None:
+        origins &= mask
+
+    # Calculating rays from each edge pixel in row-major order
+    origin_rows, origin_cols = np.nonzero(origins)
+    rays = cast_rays(gx, gy, edges, origin_rows, origin_cols, gradient_direction, mask)
+
+    # Assigning each ray's width to its pixels, keeping the smallest width
+    swt_img = backend.get_kernel("fill_stroke_widths")(img.shape, rays.offsets, rays.rows, rays.cols)
+
+    # Assigning the median of each ray to ray pixels that are above the median
+    return backend.get_kernel("apply_ray_medians")(swt_img, rays.offsets, rays.rows, rays.cols)
+
+
+def run_sparse(img, gradient_direction, mask=None):
+    """Same as run(), but returns a SparseStrokeWidths holding only the pixels with a stroke width"""
+
+    edges, gx, gy = get_edges_and_gradients(img)
+
+    origins = edges > 0
+    if mask is not None:
+        origins &= mask
+
+    origin_rows, origin_cols = np.nonzero(origins)
+    rays = cast_rays(gx, gy, edges, origin_rows, origin_cols, gradient_direction, mask)
+    return sparse_from_rays(img.shape, rays)
+
+
+def sparse_from_rays(shape, rays):
+    """Builds the sparse SWT from rays, giving the same stroke widths as the dense kernels"""
+    num_cols = shape[1]
+    keys = rays.rows * num_cols + rays.cols
+    keys, point_pixels = np.unique(keys, return_inverse=True)
+    point_pixels = point_pixels.ravel()
+
+    # Each pixel takes the smallest width of the rays through it
+    lengths = np.diff(rays.offsets)
+    point_widths = np.repeat(rays.get_widths(), lengths)
+    widths = np.full(len(keys), np.inf)
+    np.minimum.at(widths, point_pixels, point_widths)
+
+    # Ray pixels above their ray's median are lowered to the median.
+    # Where rays disagree, the last ray in casting order wins, as in apply_ray_medians.
+    point_values = widths[point_pixels]
+    point_medians = np.repeat(backend.get_kernel("ray_medians")(point_values, rays.offsets), lengths)
+    updates = np.nonzero(point_values > point_medians)[0][::-1]
+    _, last = np.unique(point_pixels[updates], return_index=True)
+    widths[point_pixels[updates[last]]] = point_medians[updates[last]]
+
+    # Zero width rays do not mark a stroke, same as the dense image
+    keep = widths > 0
+    keys = keys[keep]
+    return SparseStrokeWidths(shape, keys // num_cols, keys % num_cols, widths[keep])
+
+
+class SparseStrokeWidths:
+    """The pixels of an SWT image that have a stroke width, in row-major order"""
+    def __init__(self, shape, rows, cols, widths):
+        self.shape = tuple(shape)
+        self.rows = rows
+        self.cols = cols
+        self.widths = widths
+
+    def __len__(self):
+        return len(self.widths)
+
+    # Row-major index of each pixel, sorted
+    def get_keys(self):
+        return self.rows * self.shape[1] + self.cols
+
+    # Start of each image row in the pixel arrays, as in a CSR matrix
+    def get_row_offsets(self):
+        return np.searchsorted(self.rows, np.arange(self.shape[0] + 1))
+
+    def to_dense(self):
+        swt_img = np.zeros(self.shape)
+        swt_img[self.rows, self.cols] = self.widths
+        return swt_img
+
+
+def sparse_from_dense(swt_img):
+    rows, cols = np.nonzero(swt_img > 0)
+    return SparseStrokeWidths(swt_img.shape, rows.astype(np.int64), cols.astype(np.int64), swt_img[rows, cols])
+
+
+def get_edges_and_gradients(img):
+    """Returns the Canny edges and the gradient derivatives the SWT is computed from"""
 
     # Getting Canny edges
-    edges = cv2.Canny(img, 100, 300)
+    edges = cv2.Canny(img, *__canny_thresholds)
     # Getting gradient derivatives
     # Note: can also use a Scharr filter here if
     # ksize is set to -1. Potentially, provides better
@@ -16,28 +122,42 @@ def run(img, gradient_direction):
     gy = cv2.Sobel(img, cv2.CV_64F, 1, 0, ksize=-1)
     gx = cv2.Sobel(img, cv2.CV_64F, 0, 1, ksize=-1)
 
+    return edges, gx, gy
+
+
+def get_edges_from_derivatives(dx, dy):
+    """Same edges as get_edges_and_gradients, from the 16 bit 3x3 Sobel derivatives of the image.
+    Canny computes these itself with replicated borders, pixels where both are zero never become edges.
+    """
+    return cv2.Canny(dx, dy, *__canny_thresholds)
+
+
+def cast_rays(gx, gy, edges, origin_rows, origin_cols, gradient_direction, region=None):
+    """Casts a ray from every origin and returns the rays that reached an opposite edge.
+    Rays leaving the image, or the optional boolean region image, are dropped.
+    """
+    offsets, rows, cols = backend.get_kernel("cast_rays")(
+        gx, gy, edges, origin_rows, origin_cols, gradient_direction, math.pi / 2, region)
+    return cr.Rays(offsets, rows, cols)
+
+
+@backend.register_kernel("fill_stroke_widths")
+def fill_stroke_widths(shape, offsets, rows, cols):
+    """Builds the SWT image from rays, pixels without a ray are zero"""
+
     # Setting up SWT image
-    swt_img = np.empty(img.shape)
+    swt_img = np.empty(shape)
     swt_img[:] = np.Infinity  # Setting all values to infinite
 
-    rays = []
-    # Looping through each pixel, calculating rays
-    for row in range(img.shape[0]):
-        for col in range(img.shape[1]):
-            edge = edges[row, col]
-            if edge > 0:  # Checking if we're on an edge
-                # Passing in single derivative values for rows and cols
-                # Along with edges and ray origin
-                ray = cr.cast_ray(gx, gy, edges, row, col, gradient_direction, math.pi / 2)
-                if ray != None:
-                    # Adding ray to rays accumulator
-                    rays.append(ray)
-                    # Calculating the width of the ray
-                    width = cr.magnitude(ray[len(ray) - 1][0] - ray[0][0], ray[len(ray) - 1][1] - ray[0][1])
-                    # Assigning width to each pixel in the ray
-                    for point in ray:
-                        if swt_img[point[0], point[1]] > width:
-                            swt_img[point[0], point[1]] = width
+    for i in range(len(offsets) - 1):
+        start = offsets[i]
+        end = offsets[i + 1]
+        # Calculating the width of the ray
+        width = cr.magnitude(rows[end - 1] - rows[start], cols[end - 1] - cols[start])
+        # Assigning width to each pixel in the ray
+        for j in range(start, end):
+            if swt_img[rows[j], cols[j]] > width:
+                swt_img[rows[j], cols[j]] = width
 
     # Set values of infinity to zero so that only values that had ray > 0
     for row in range(swt_img.shape[0]):
@@ -45,18 +165,28 @@ def run(img, gradient_direction):
          if swt_img[row, col] == np.Infinity:
            swt_img[row, col] = 0
 
+    return swt_img
+
+
+@backend.register_kernel("apply_ray_medians")
+def apply_ray_medians(swt_img, offsets, rows, cols):
+    """Lowers ray pixels above their ray's median stroke width to the median"""
+
     # Creating a copy of the SWT image
     swt_median = copy.deepcopy(swt_img)
+    if len(offsets) < 2:
+        return swt_median
 
-    # Looping through rays and assigning the median value
-    # to ray pixels that are above the median
-    for ray in rays:
-        # Getting median of each ray's values
-        median = cr.median_ray(ray, swt_img)
+    # Getting the median of every ray's values at once
+    values = swt_img[rows, cols]
+    point_medians = np.repeat(median.segmented_median(values, offsets), np.diff(offsets))
 
-        # Loop through ray and change pixel values greater than median
-        for coordinate in ray:
-            if swt_img[coordinate[0], coordinate[1]] > median:
-                swt_median[coordinate[0], coordinate[1]] = median
+    # Changing ray pixel values greater than their ray's median.
+    # Where rays disagree, the last ray wins, as when looping over the rays.
+    num_cols = swt_img.shape[1]
+    updates = np.nonzero(values > point_medians)[0][::-1]
+    _, last = np.unique(rows[updates] * num_cols + cols[updates], return_index=True)
+    updates = updates[last]
+    swt_median[rows[updates], cols[updates]] = point_medians[updates]
 
     return swt_median
@@ -3,8 +3,14 @@ import timeit
 setup = """\
 import cv2
 import pyswt
+from pyswt import batch
 img_path = "./images/swt-example-1.png"
 img = cv2.imread(img_path)
+crops = [img[row:row + 48, col:col + 64] for row in range(0, img.shape[0] - 48, 48) for col in range(0, img.shape[1] - 64, 64)]
 """
 
 print(timeit.timeit("pyswt.run(img)",setup,number=1))
+
+# Small crops, one call per crop against one batch call for all of them
+print(timeit.timeit("[pyswt.detect_boxes(crop) for crop in crops]",setup,number=1))
+print(timeit.timeit("batch.detect_boxes(crops)",setup,number=1))
@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+import pytest
+
+from pyswt import backend
+from pyswt import connected_component
+from pyswt import filter_connected_components
+from pyswt import letter_chains
+from pyswt import swt
+from pyswt.detector import get_boxes
+
+
+def make_text_image():
+    """Small grayscale image with light and dark text, some of it touching the borders"""
+    img = np.full((120, 160), 40, np.uint8)
+    img[60:, :] = 220
+    cv2.putText(img, "SWT", (4, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.4, 230, 3)
+    cv2.putText(img, "Text", (20, 110), cv2.FONT_HERSHEY_DUPLEX, 1.2, 30, 2)
+    cv2.putText(img, "edge", (110, 8), cv2.FONT_HERSHEY_PLAIN, 1.0, 200, 1)
+    return img
+
+
+@pytest.fixture
+def text_image():
+    """The grayscale test image"""
+    return make_text_image()
+
+
+@pytest.fixture
+def bgr_text_image():
+    """The test image as a BGR image, as pyswt.detect takes it"""
+    return np.ascontiguousarray(np.repeat(make_text_image()[:, :, None], 3, axis=2))
+
+
+@pytest.fixture(params=[1, -1], ids=["light", "dark"])
+def gradient_direction(request):
+    """Light text (1) and dark text (-1)"""
+    return request.param
+
+
+@pytest.fixture
+def sort_boxes():
+    """Returns a function turning a box array into a sorted list of tuples, to compare box sets"""
+    def sort(boxes):
+        return sorted(map(tuple, np.asarray(boxes).reshape(-1, 5).tolist()))
+    return sort
+
+
+@pytest.fixture
+def get_dense_boxes():
+    """Returns a function giving the boxes of the dense pyswt.run pipeline, which the other paths must reproduce"""
+    def get(img, text_mask=None):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        chains_light_dark = []
+        for gradient_direction in [1, -1]:
+            swt_img = swt.run(gray, gradient_direction, text_mask)
+            _, cc_data = connected_component.run(gray, swt_img)
+            chains_light_dark.append(letter_chains.run(filter_connected_components.run(cc_data)))
+        return get_boxes(chains_light_dark)
+    return get
+
+
+@pytest.fixture
+def restore_backend():
+    """Resets the backend a test selected with backend.set_backend"""
+    yield
+    backend.set_backend(None)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import pyswt
+from pyswt import Detector, DetectorConfig
+from pyswt import anytime
+from pyswt import backend
+from pyswt import connected_component
+from pyswt import swt
+from pyswt.letter_chains import ChainConfig
+
+
+@pytest.fixture
+def large_image(bgr_text_image):
+    return np.ascontiguousarray(np.tile(bgr_text_image, (4, 4, 1)))
+
+
+class FakeClock:
+    """Stands in for the time module, time only passes when the test advances it"""
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.mark.parametrize("budget", [0.02, 0.1, 0.3])
+def test_budget_is_kept(large_image, budget, monkeypatch):
+    # Setup takes 5 ms and casting each tile 10 ms, so the whole image takes seconds
+    clock = FakeClock()
+    monkeypatch.setattr(anytime, "time", clock)
+    monkeypatch.setattr(connected_component, "time", clock)
+    get_edges_and_gradients = swt.get_edges_and_gradients
+    cast_rays = swt.cast_rays
+
+    def slow_get_edges_and_gradients(*args):
+        clock.now += 0.005
+        return get_edges_and_gradients(*args)
+
+    def slow_cast_rays(*args):
+        clock.now += 0.01
+        return cast_rays(*args)
+
+    monkeypatch.setattr(swt, "get_edges_and_gradients", slow_get_edges_and_gradients)
+    monkeypatch.setattr(swt, "cast_rays", slow_cast_rays)
+
+    result = anytime.detect(large_image, budget)
+    assert result.partial
+    assert 0 < result.origins_cast < result.origins_total
+    # Casting stops at the first tile past its deadline
+    assert 0 < result.setup_time < result.elapsed <= budget + 0.01 + 1e-9
+
+
+def test_more_budget_finds_more(large_image, sort_boxes):
+    anytime.detect(large_image, 10)
+    results = [anytime.detect(large_image, budget) for budget in [0, 0.05, 30]]
+    cast = [result.origins_cast for result in results]
+    assert cast == sorted(cast)
+
+    assert results[0].partial
+    assert not results[-1].partial
+    assert results[-1].origins_cast == results[-1].origins_total
+    assert sort_boxes(results[-1].get_boxes()) == sort_boxes(pyswt.detect_boxes(large_image))
+
+
+def test_config_is_used(bgr_text_image, sort_boxes, monkeypatch):
+    # Drops the taller light text the default config finds
+    config = DetectorConfig(backend="python", chains=ChainConfig(max_chain_height=30), max_components=1000,
+                            max_pairs=5000)
+    backends = []
+    cast_rays = swt.cast_rays
+
+    def recording_cast_rays(*args):
+        backends.append(backend.get_backend())
+        return cast_rays(*args)
+
+    monkeypatch.setattr(swt, "cast_rays", recording_cast_rays)
+    result = anytime.detect(bgr_text_image, 30, config=config)
+    assert set(backends) == {"python"}
+    assert not result.partial
+    assert sort_boxes(result.get_boxes()) == sort_boxes(Detector(config).detect_boxes(bgr_text_image))
+    assert sort_boxes(result.get_boxes()) != sort_boxes(pyswt.detect_boxes(bgr_text_image))
+
+    strict = DetectorConfig(chains=ChainConfig(min_chain_size=100), max_components=1000, max_pairs=10000)
+    assert len(anytime.detect(bgr_text_image, 30, config=strict).get_boxes()) == 0
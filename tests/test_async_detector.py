@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import pyswt
+from pyswt import async_detector
+
+
+def test_async_detector_matches_detect(bgr_text_image, sort_boxes, get_dense_boxes):
+    imgs = [bgr_text_image, np.ascontiguousarray(bgr_text_image[:, ::-1])]
+    calls = []
+
+    def detect_boxes(img):
+        calls.append(img)
+        return pyswt.detect_boxes(img)
+
+    async def detect_all():
+        async with pyswt.AsyncDetector(detect_boxes, max_concurrency=2) as detector:
+            return await asyncio.gather(*[detector.detect(img) for img in imgs * 3])
+
+    results = asyncio.run(detect_all())
+    # Identical images requested together share one detection
+    assert len(calls) == 2
+    for img, boxes in zip(imgs * 3, results):
+        assert sort_boxes(boxes) == sort_boxes(get_dense_boxes(img))
+    assert len(results[0]) > 0
+
+
+def test_async_detector_timeout(bgr_text_image):
+    # Does no detection, the abandoned call must not run the pipeline alongside later tests
+    def slow_detect(img):
+        time.sleep(0.5)
+        return np.zeros((0, 5), np.int64)
+
+    async def detect():
+        async with pyswt.AsyncDetector(slow_detect, timeout=0.05) as detector:
+            return await detector.detect(bgr_text_image)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(detect())
+
+
+def test_async_detector_restarts_abandoned_detection(bgr_text_image):
+    release = threading.Event()
+    calls = []
+
+    def blocking_detect(img):
+        calls.append(img)
+        call = len(calls)
+        release.wait(5)
+        return np.zeros((call, 5), np.int64)
+
+    async def detect():
+        async with pyswt.AsyncDetector(blocking_detect, max_concurrency=2) as detector:
+            with pytest.raises(asyncio.TimeoutError):
+                await detector.detect(bgr_text_image, timeout=0.05)
+            # The timed out request was the only one waiting, so the same image starts a new detection
+            release.set()
+            return await detector.detect(bgr_text_image)
+
+    # The result is the second detection's, not the abandoned one's
+    assert len(asyncio.run(detect())) == 2
+    assert len(calls) == 2
+
+
+def test_image_key():
+    img = np.arange(60, dtype=np.uint8).reshape(5, 4, 3)
+    view = img[:, ::-1]
+    assert async_detector.image_key(view) == async_detector.image_key(np.ascontiguousarray(view))
+    assert async_detector.image_key(view) != async_detector.image_key(img)
+    assert async_detector.image_key(img) != async_detector.image_key(img.astype(np.int16))
+    assert async_detector.image_key(img) != async_detector.image_key(img.reshape(4, 5, 3))
@@ -0,0 +1,132 @@
+import math
+import threading
+
+import numpy as np
+import pytest
+
+from pyswt import backend
+from pyswt import connected_component
+from pyswt import swt
+
+# Every kernel of every installed backend is checked against the reference implementation
+compiled_backends = [b for b in backend.available_backends() if b != "python"]
+
+
+@pytest.fixture
+def rays_input(text_image, gradient_direction):
+    gray = text_image
+    edges, gx, gy = swt.get_edges_and_gradients(gray)
+    origin_rows, origin_cols = np.nonzero(edges)
+    return gray, edges, gx, gy, origin_rows, origin_cols, gradient_direction
+
+
+def test_reference_backend_always_available():
+    assert backend.available_backends()[0] == "python"
+    for name in ["cast_rays", "fill_stroke_widths", "apply_ray_medians", "ray_medians", "region_grow",
+                 "region_grow_sparse"]:
+        assert name in backend.get_kernel_names()
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        backend.set_backend("no-such-backend")
+
+
+def test_missing_backend_falls_back_to_reference(monkeypatch):
+    monkeypatch.setattr(backend, "available_backends", lambda: ["python"])
+    assert backend.get_kernel("cast_rays", "numba") is backend.get_kernel("cast_rays", "python")
+
+
+@pytest.mark.parametrize("name", compiled_backends)
+def test_cast_rays(name, rays_input):
+    _, edges, gx, gy, origin_rows, origin_cols, gradient_direction = rays_input
+    expected = backend.get_kernel("cast_rays", "python")(
+        gx, gy, edges, origin_rows, origin_cols, gradient_direction, math.pi / 2)
+    actual = backend.get_kernel("cast_rays", name)(
+        gx, gy, edges, origin_rows, origin_cols, gradient_direction, math.pi / 2)
+
+    assert len(expected[0]) > 1
+    for e, a in zip(expected, actual):
+        np.testing.assert_array_equal(a, e)
+
+
+@pytest.mark.parametrize("name", compiled_backends)
+def test_cast_rays_in_region(name, rays_input):
+    _, edges, gx, gy, origin_rows, origin_cols, gradient_direction = rays_input
+    region = np.zeros(edges.shape, bool)
+    region[:, :edges.shape[1] // 2] = True
+    expected = backend.get_kernel("cast_rays", "python")(
+        gx, gy, edges, origin_rows, origin_cols, gradient_direction, math.pi / 2, region)
+    actual = backend.get_kernel("cast_rays", name)(
+        gx, gy, edges, origin_rows, origin_cols, gradient_direction, math.pi / 2, region)
+
+    assert len(expected[0]) > 1
+    for e, a in zip(expected, actual):
+        np.testing.assert_array_equal(a, e)
+
+
+@pytest.mark.parametrize("name", ["python"] + compiled_backends)
+def test_rays_stay_inside(name, rays_input, restore_backend):
+    _, edges, gx, gy, origin_rows, origin_cols, gradient_direction = rays_input
+    backend.set_backend(name)
+    # Rays are dropped instead of wrapping around to the opposite border
+    rays = swt.cast_rays(gx, gy, edges, origin_rows, origin_cols, gradient_direction)
+    assert rays.rows.min() >= 0 and rays.cols.min() >= 0
+    assert rays.rows.max() < edges.shape[0] and rays.cols.max() < edges.shape[1]
+
+    region = np.zeros(edges.shape, bool)
+    region[20:, 30:] = True
+    inside = region[origin_rows, origin_cols]
+    in_region = swt.cast_rays(gx, gy, edges, origin_rows[inside], origin_cols[inside], gradient_direction, region)
+    assert 0 < len(in_region.offsets) - 1 < len(rays.offsets) - 1
+    assert region[in_region.rows, in_region.cols].all()
+
+
+@pytest.mark.parametrize("name", compiled_backends)
+def test_stroke_width_kernels(name, rays_input):
+    gray, edges, gx, gy, origin_rows, origin_cols, gradient_direction = rays_input
+    rays = swt.cast_rays(gx, gy, edges, origin_rows, origin_cols, gradient_direction)
+
+    expected = backend.get_kernel("fill_stroke_widths", "python")(gray.shape, rays.offsets, rays.rows, rays.cols)
+    actual = backend.get_kernel("fill_stroke_widths", name)(gray.shape, rays.offsets, rays.rows, rays.cols)
+    np.testing.assert_array_equal(actual, expected)
+
+    values = expected[rays.rows, rays.cols]
+    np.testing.assert_array_equal(backend.get_kernel("ray_medians", name)(values, rays.offsets),
+                                  backend.get_kernel("ray_medians", "python")(values, rays.offsets))
+
+    expected = backend.get_kernel("apply_ray_medians", "python")(expected, rays.offsets, rays.rows, rays.cols)
+    actual = backend.get_kernel("apply_ray_medians", name)(actual, rays.offsets, rays.rows, rays.cols)
+    np.testing.assert_array_equal(actual, expected)
+
+
+@pytest.mark.parametrize("name", compiled_backends)
+def test_connected_components(name, text_image, gradient_direction, restore_backend):
+    gray = text_image
+    backend.set_backend("python")
+    swt_img = swt.run(gray, gradient_direction)
+    expected_img, expected_data = connected_component.run(gray, swt_img)
+
+    backend.set_backend(name)
+    actual_img, actual_data = connected_component.run(gray, swt_img)
+
+    np.testing.assert_array_equal(actual_img, expected_img)
+    assert len(actual_data) == len(expected_data) > 0
+    for a, e in zip(actual_data, expected_data):
+        assert a.label == e.label
+        assert a.get_bounding_box() == e.get_bounding_box()
+        assert a.pixel_coordinates == e.pixel_coordinates
+        assert a.stroke_widths == e.stroke_widths
+        assert a.grays == e.grays
+
+
+def test_use_backend_is_thread_local(restore_backend):
+    backend.set_backend("python")
+    seen = []
+    with backend.use_backend(None):
+        assert backend.get_backend() == backend.available_backends()[-1]
+        thread = threading.Thread(target=lambda: seen.append(backend.get_backend()))
+        thread.start()
+        thread.join()
+    assert seen == ["python"]
+    assert backend.get_backend() == "python"
@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+import pytest
+
+import pyswt
+from pyswt import Detector, DetectorConfig
+from pyswt import backend
+from pyswt import batch
+from pyswt import swt
+from pyswt.letter_chains import ChainConfig
+
+
+@pytest.fixture
+def images(bgr_text_image):
+    img = bgr_text_image
+    return [np.ascontiguousarray(crop) for crop in [img, img[:60, :90], img[50:, 30:], img[10:100, 5:150], img[30:, 10:]]]
+
+
+def test_pack_separates_images():
+    shapes = [(120, 160), (60, 90), (70, 130), (90, 145), (300, 20)]
+    mosaics = batch.pack(shapes, (200, 300), guard=2)
+    assert sorted(i for mosaic in mosaics for i in mosaic.indices) == list(range(len(shapes)))
+
+    for mosaic in mosaics:
+        covered = np.zeros(mosaic.shape, np.int64)
+        for row, col, (num_rows, num_cols) in zip(mosaic.rows, mosaic.cols, mosaic.shapes):
+            # Each image and its guard border lie inside the mosaic without overlapping another image
+            assert row >= 2 and col >= 2
+            assert row + num_rows + 2 <= mosaic.shape[0] and col + num_cols + 2 <= mosaic.shape[1]
+            covered[row - 2:row + num_rows + 2, col - 2:col + num_cols + 2] += 1
+        assert covered.max() == 1
+
+
+def test_matches_detect_boxes(images, sort_boxes):
+    together = batch.detect_boxes(images, (400, 800))
+    assert sum(len(boxes) for boxes in together) > 0
+
+    for img, boxes in zip(images, together):
+        assert sort_boxes(boxes) == sort_boxes(pyswt.detect_boxes(img))
+
+
+def test_edges_match_single_images(images):
+    mosaic = batch.pack([img.shape[:2] for img in images], (400, 800))[0]
+    gray = cv2.cvtColor(mosaic.get_image(images), cv2.COLOR_BGR2GRAY)
+    image_ids = mosaic.get_image_ids()
+    edges = mosaic.get_edges(gray, image_ids >= 0)
+    _, gx, gy = swt.get_edges_and_gradients(gray)
+
+    # Edges are only found inside images, and inside each they are the ones of a single image run
+    assert not edges[image_ids < 0].any()
+    for index, tile in zip(mosaic.indices, mosaic.get_tiles()):
+        single_edges, single_gx, single_gy = swt.get_edges_and_gradients(cv2.cvtColor(images[index],
+                                                                                       cv2.COLOR_BGR2GRAY))
+        np.testing.assert_array_equal(edges[tile], single_edges)
+        np.testing.assert_array_equal(gx[tile], single_gx)
+        np.testing.assert_array_equal(gy[tile], single_gy)
+
+
+def test_work_is_done_once_per_mosaic(images, monkeypatch):
+    calls = {"get_edges_and_gradients": 0, "cast_rays": 0, "sparse_from_rays": 0}
+
+    def counting(name):
+        func = getattr(swt, name)
+
+        def count(*args):
+            calls[name] += 1
+            return func(*args)
+        return count
+
+    for name in calls:
+        monkeypatch.setattr(swt, name, counting(name))
+    crops = [np.ascontiguousarray(img[:40, :60]) for img in images] * 4
+    batch.detect_boxes(crops, (400, 800))
+    # Once per mosaic and polarity, instead of once per image and polarity
+    assert calls == {"get_edges_and_gradients": 1, "cast_rays": 2, "sparse_from_rays": 2}
+
+
+def test_large_image_gets_own_mosaic(bgr_text_image, sort_boxes):
+    small = np.ascontiguousarray(bgr_text_image[:40, :60])
+    boxes = batch.detect_boxes([small, bgr_text_image], (200, 200))
+    assert sort_boxes(boxes[1]) == sort_boxes(pyswt.detect_boxes(bgr_text_image))
+    assert sort_boxes(boxes[0]) == sort_boxes(pyswt.detect_boxes(small))
+
+
+def test_config_is_used(images, sort_boxes, monkeypatch):
+    # Drops the taller light text the default config finds
+    config = DetectorConfig(backend="python", chains=ChainConfig(max_chain_height=30), max_pairs=5000)
+    backends = []
+    cast_rays = swt.cast_rays
+
+    def recording_cast_rays(*args):
+        backends.append(backend.get_backend())
+        return cast_rays(*args)
+
+    monkeypatch.setattr(swt, "cast_rays", recording_cast_rays)
+    together = batch.detect_boxes(images, config=config)
+    assert set(backends) == {"python"}
+
+    detector = Detector(config)
+    for img, boxes in zip(images, together):
+        assert sort_boxes(boxes) == sort_boxes(detector.detect_boxes(img))
+    assert [sort_boxes(boxes) for boxes in together] != [sort_boxes(pyswt.detect_boxes(img)) for img in images]
+
+    # Chains can never be this long, so nothing is detected
+    strict = DetectorConfig(chains=ChainConfig(min_chain_size=100))
+    assert sum(len(boxes) for boxes in batch.detect_boxes(images, config=strict)) == 0
@@ -0,0 +1,118 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from pyswt import backend
+from pyswt import connected_component
+from pyswt import filter_connected_components
+from pyswt import swt
+
+# The sparse kernels of every installed backend are checked against the dense reference
+compiled_backends = [b for b in backend.available_backends() if b != "python"]
+
+
+@pytest.mark.parametrize("name", ["python"] + compiled_backends)
+def test_sparse_connected_components(name, text_image, gradient_direction, restore_backend):
+    gray = text_image
+    backend.set_backend("python")
+    swt_img = swt.run(gray, gradient_direction)
+    expected_img, expected_data = connected_component.run(gray, swt_img)
+
+    backend.set_backend(name)
+    stroke_widths = swt.run_sparse(gray, gradient_direction)
+    np.testing.assert_array_equal(stroke_widths.to_dense(), swt_img)
+    labels, actual_data = connected_component.run_sparse(gray, stroke_widths)
+
+    np.testing.assert_array_equal(connected_component.get_component_image(labels, stroke_widths), expected_img)
+    assert len(actual_data) == len(expected_data) > 0
+    for a, e in zip(actual_data, expected_data):
+        assert a.label == e.label
+        assert a.pixel_coordinates == e.pixel_coordinates
+        assert a.stroke_widths == e.stroke_widths
+        assert a.grays == e.grays
+
+
+def test_sparse_neighbours_found_in_one_search(text_image, gradient_direction, monkeypatch, restore_backend):
+    backend.set_backend("python")
+    stroke_widths = swt.run_sparse(text_image, gradient_direction)
+    searchsorted = np.searchsorted
+    calls = []
+
+    def counting_searchsorted(*args, **kwargs):
+        calls.append(args)
+        return searchsorted(*args, **kwargs)
+
+    monkeypatch.setattr(np, "searchsorted", counting_searchsorted)
+    _, cc_data = connected_component.run_sparse(text_image, stroke_widths)
+    assert len(cc_data) > 0
+    assert len(calls) == 1
+
+
+def test_sparse_labelling_skips_blank_area(text_image, restore_backend):
+    backend.set_backend("python")
+    # The same strokes, alone and in the corner of a blank image 16 times the size
+    blank = np.full((text_image.shape[0] * 4, text_image.shape[1] * 4), 40, np.uint8)
+    blank[:text_image.shape[0], :text_image.shape[1]] = text_image
+
+    def peak_bytes(func):
+        tracemalloc.start()
+        try:
+            func()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    sparse_peaks = []
+    dense_peaks = []
+    for gray in [text_image, blank]:
+        stroke_widths = swt.run_sparse(gray, -1)
+        swt_img = stroke_widths.to_dense()
+        sparse_peaks.append(peak_bytes(lambda: connected_component.run_sparse(gray, stroke_widths)))
+        dense_peaks.append(peak_bytes(lambda: connected_component.run(gray, swt_img)))
+
+    # Sparse labelling only works on stroke pixels, dense labelling on the whole image
+    assert sparse_peaks[1] < 1.1 * sparse_peaks[0]
+    assert dense_peaks[1] > 4 * dense_peaks[0]
+    assert sparse_peaks[1] < dense_peaks[1]
+
+
+def test_component_masks(text_image, gradient_direction):
+    gray = text_image
+    swt_img = swt.run(gray, gradient_direction)
+    component_img, cc_data = connected_component.run(gray, swt_img)
+
+    rendered = connected_component.get_connected_component_image(cc_data, *gray.shape)
+    # Small components are labelled in the component image but not returned
+    np.testing.assert_array_equal(rendered[:, :, 0] > 0, np.isin(component_img, [cc.label for cc in cc_data]))
+
+    for cc in cc_data:
+        labelled = component_img[cc.row_min:cc.row_max + 1, cc.col_min:cc.col_max + 1] == cc.label
+        np.testing.assert_array_equal(cc.get_mask(), labelled)
+        np.testing.assert_array_equal(connected_component.render_runs(cc.get_runs(), *gray.shape),
+                                      component_img == cc.label)
+        assert cc.get_mask().sum() == cc.get_runs()[:, 2].sum() - cc.get_runs()[:, 1].sum() == cc.area
+        assert cc.get_overlap_area(cc) == cc.area
+        for other in cc_data:
+            if other is not cc:
+                assert cc.get_overlap_area(other) == 0
+
+
+def test_streaming_filters(text_image, gradient_direction):
+    gray = text_image
+    stroke_widths = swt.run_sparse(gray, gradient_direction)
+    _, cc_data = connected_component.run_sparse(gray, stroke_widths)
+
+    # The single component filters, applied one list at a time
+    expected = cc_data
+    for list_filter in [filter_connected_components.filter_by_bounding_box_area,
+                        filter_connected_components.filter_by_component_height,
+                        filter_connected_components.filter_by_aspect_ratio,
+                        filter_connected_components.filter_by_relative_width,
+                        filter_connected_components.filter_by_stroke_width_variance]:
+        expected = list_filter(expected)
+    expected = filter_connected_components.filter_if_contains_other_components(expected)
+
+    actual = filter_connected_components.run(connected_component.iter_sparse(gray, stroke_widths))
+    assert [cc.label for cc in actual] == [cc.label for cc in expected]
+    assert len(expected) > 0
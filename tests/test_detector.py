@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import pyswt
+from pyswt import Detector, DetectorConfig
+from pyswt.letter_chains import ChainConfig
+
+
+def test_default_detector_matches_detect(bgr_text_image):
+    img = bgr_text_image
+    np.testing.assert_array_equal(Detector().detect_boxes(img), pyswt.detect_boxes(img))
+
+
+def test_detectors_keep_their_own_config(bgr_text_image, sort_boxes):
+    img = bgr_text_image
+    default = Detector()
+    # Chains can never be this long, so nothing is detected
+    strict = Detector(DetectorConfig(backend="python", chains=ChainConfig(min_chain_size=100)))
+    expected = default.detect_boxes(img)
+    assert len(expected) > 0
+
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(detector.detect_boxes, img) for detector in [default, strict] * 4]
+        results = [future.result() for future in futures]
+
+    for k, boxes in enumerate(results):
+        if k % 2 == 0:
+            assert sort_boxes(boxes) == sort_boxes(expected)
+        else:
+            assert len(boxes) == 0
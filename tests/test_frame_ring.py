@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import pyswt
+from pyswt.frame_ring import FramePool, FrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(3, (120, 160, 3))
+    yield ring
+    ring.close()
+
+
+def test_ring_round_trip(ring, bgr_text_image):
+    ring.write(0, bgr_text_image)
+    ring.write(1, bgr_text_image[:60, :90])
+    np.testing.assert_array_equal(ring.get_frame(0), bgr_text_image)
+    np.testing.assert_array_equal(ring.get_frame(1), bgr_text_image[:60, :90])
+
+    with pytest.raises(ValueError):
+        ring.write(2, np.zeros((121, 160, 3), np.uint8))
+    with pytest.raises(ValueError):
+        ring.reserve(2, (120, 160))
+
+
+def test_reserved_slot_is_shared(ring, bgr_text_image):
+    # A second ring attached by name sees frames written into a reserved view, nothing is copied
+    attached = FrameRing(*ring.get_description())
+    try:
+        frame = ring.reserve(2, (60, 90, 3))
+        frame[:] = bgr_text_image[:60, :90]
+        np.testing.assert_array_equal(attached.get_frame(2), bgr_text_image[:60, :90])
+        assert np.shares_memory(frame, ring.get_frame(2))
+    finally:
+        attached.close()
+
+
+def test_frame_pool(bgr_text_image, sort_boxes):
+    frames = [bgr_text_image, np.ascontiguousarray(bgr_text_image[:, ::-1]), bgr_text_image[:60, :90]] * 2
+    with FramePool((120, 160, 3), processes=2, num_slots=2) as pool:
+        name = pool.ring.name
+        # Results come back in submission order, with more frames than slots
+        results = list(pool.map(frames))
+        for frame, boxes in zip(frames, results):
+            assert sort_boxes(boxes) == sort_boxes(pyswt.detect_boxes(frame))
+
+        # Slots go back to the pool once their frame is done or released
+        slot, frame = pool.reserve()
+        frame[:] = bgr_text_image
+        future = pool.commit(slot)
+        assert sort_boxes(future.result()) == sort_boxes(pyswt.detect_boxes(bgr_text_image))
+
+        slots = [pool.reserve(timeout=5)[0] for _ in range(2)]
+        with pytest.raises(TimeoutError):
+            pool.reserve(timeout=0.01)
+        for slot in slots:
+            pool.release(slot)
+
+    # Closing the pool frees the shared memory
+    with pytest.raises(FileNotFoundError):
+        FrameRing(2, (120, 160, 3), name=name)
@@ -0,0 +1,62 @@
+import pytest
+
+from pyswt import connected_component
+from pyswt import filter_connected_components
+from pyswt import letter_chains
+from pyswt import swt
+from pyswt.letter_chains import ChainConfig
+
+
+def get_reference_pairs(ccs, config):
+    """The pairs kept by testing every pair of components one at a time"""
+    pairs = []
+    for i in range(len(ccs)):
+        for j in range(i + 1, len(ccs)):
+            cc_0, cc_1 = ccs[i], ccs[j]
+            if not letter_chains.is_within_relative_distance(cc_0, cc_1, config):
+                continue
+            if not (cc_0.area / cc_1.area <= config.max_pair_area_ratio
+                    or cc_1.area / cc_0.area <= config.max_pair_area_ratio):
+                continue
+            height_0 = cc_0.row_max - cc_0.row_min
+            height_1 = cc_1.row_max - cc_1.row_min
+            if not (height_0 / height_1 <= config.height_max_ratio or height_1 / height_0 <= config.height_max_ratio):
+                continue
+            if not abs(cc_1.get_mean_stroke_width() - cc_0.get_mean_stroke_width()) < config.max_mean_stroke_width_diff:
+                continue
+            sw_median_0 = cc_0.get_median_stroke_width()
+            sw_median_1 = cc_1.get_median_stroke_width()
+            if sw_median_0 / sw_median_1 <= config.sw_median_max_ratio or \
+                    sw_median_1 / sw_median_0 <= config.sw_median_max_ratio:
+                pairs.append((i, j))
+    return pairs
+
+
+@pytest.fixture(params=[1, -1], ids=["light", "dark"])
+def components(request, text_image):
+    swt_img = swt.run(text_image, request.param)
+    _, cc_data = connected_component.run(text_image, swt_img)
+    return filter_connected_components.run(cc_data)
+
+
+@pytest.mark.parametrize("config", [ChainConfig(), ChainConfig(max_distance_multiplier=10, height_max_ratio=1.1,
+                                                                max_mean_stroke_width_diff=1)],
+                         ids=["default", "strict"])
+@pytest.mark.parametrize("block_pairs", [1 << 20, 7], ids=["one-block", "blocks"])
+def test_pair_table_matches_reference(components, config, block_pairs, monkeypatch):
+    monkeypatch.setattr(letter_chains, "__max_pairs_per_block", block_pairs)
+    table = letter_chains.ComponentTable(components)
+    first, second = letter_chains.populate_pair_indices(table, config)
+    keep = letter_chains.filter_pairs(table, first, second, config)
+
+    expected = get_reference_pairs(components, config)
+    assert len(expected) > 0
+    assert list(zip(first[keep].tolist(), second[keep].tolist())) == expected
+
+
+def test_no_pairs(components):
+    table = letter_chains.ComponentTable(components[:1])
+    first, second = letter_chains.populate_pair_indices(table)
+    assert len(first) == len(second) == 0
+    assert len(letter_chains.filter_pairs(table, first, second)) == 0
+    assert letter_chains.run(components[:1]) == []
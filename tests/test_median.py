@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from pyswt import median
+
+
+@pytest.mark.parametrize("kind", ["stroke_widths", "floats", "repeated"])
+def test_segmented_median_matches_numpy(kind):
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(0, 12, 500)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    n = offsets[-1]
+    values = {
+        # Lengths of integer offsets, as ray widths are
+        "stroke_widths": np.sqrt(rng.integers(0, 400, n).astype(np.float64)),
+        "floats": rng.random(n) * 20,
+        "repeated": rng.integers(0, 4, n) / 3,
+    }[kind]
+
+    expected = [np.median(values[offsets[i]:offsets[i + 1]]) if lengths[i] > 0 else np.nan
+                for i in range(len(lengths))]
+    np.testing.assert_array_equal(median.segmented_median(values, offsets), expected)
+
+
+def test_median():
+    assert median.median([3, 1, 2, 4]) == 2.5
+    assert median.median([5.5]) == 5.5
+    assert np.isnan(median.median([]))
@@ -0,0 +1,113 @@
+import threading
+
+import numpy as np
+import pytest
+
+from pyswt import Detector, DetectorConfig
+from pyswt import detector
+from pyswt import memory
+from pyswt import swt
+from pyswt.letter_chains import Chain
+from pyswt.memory import MemoryReport
+
+
+def test_memory_report(bgr_text_image, sort_boxes):
+    img = bgr_text_image
+    report = MemoryReport()
+    boxes = Detector().detect_boxes(img, report=report)
+
+    assert sort_boxes(boxes) == sort_boxes(Detector().detect_boxes(img))
+    assert list(report.stages) == ["edges", "rays", "stroke_widths", "components", "chains"]
+    assert all(stats.calls == 2 for name, stats in report.stages.items() if name != "edges")
+    assert report.peak_bytes >= max(stats.peak_bytes for stats in report.stages.values()) > 0
+    assert report.counts["rays"] > 0 and report.counts["component_pixels"] > 0
+    assert report.counts["chains"] == len(boxes)
+    assert report.tiles == 1
+
+
+def test_traced_detections_run_one_at_a_time(bgr_text_image):
+    order = []
+
+    def detect():
+        Detector().detect_boxes(bgr_text_image, report=MemoryReport())
+        order.append("other")
+
+    with MemoryReport().trace():
+        thread = threading.Thread(target=detect)
+        thread.start()
+        # The other thread's detection waits, its reset_peak and stop would corrupt this trace
+        thread.join(0.2)
+        assert thread.is_alive()
+        order.append("first")
+    thread.join()
+    assert order == ["first", "other"]
+
+
+def test_memory_limit_falls_back_to_tiles(bgr_text_image):
+    img = np.tile(bgr_text_image, (3, 3, 1))
+    report = MemoryReport()
+    memory_limit = 200 * 200 * 400
+    tiled = Detector(DetectorConfig(memory_limit=memory_limit)).detect_boxes(img, report=report)
+    assert report.tiles > 1 and report.tile_size < max(img.shape)
+    assert 0 < report.peak_bytes <= memory_limit
+
+    # Long lines can be split at tile borders, but all text is still found
+    assert (tiled[:, :2] >= 0).all() and (tiled[:, 2] < img.shape[0]).all() and (tiled[:, 3] < img.shape[1]).all()
+    for box in Detector().detect_boxes(img):
+        same = tiled[tiled[:, 4] == box[4]]
+        assert ((same[:, 0] <= box[2]) & (same[:, 2] >= box[0]) & (same[:, 1] <= box[3]) & (same[:, 3] >= box[1])).any()
+
+
+def test_memory_limit_too_low(bgr_text_image):
+    assert memory.get_tile_size((1000, 1000), 128 * 128 * 400) == 128
+    assert memory.get_tile_size((100, 1000), 100 * 128 * 400) == 128
+    with pytest.raises(ValueError):
+        memory.get_tile_size((1000, 1000), 128 * 128 * 400 - 1)
+    with pytest.raises(ValueError):
+        Detector(DetectorConfig(memory_limit=1000)).detect_boxes(bgr_text_image)
+
+
+def test_memory_error_retries_with_smaller_tiles(bgr_text_image, sort_boxes, monkeypatch):
+    img = np.ascontiguousarray(np.tile(bgr_text_image, (3, 3, 1)))
+    memory_limit = memory.estimate_peak_bytes(img.shape[:2])
+    retry_tile_size = memory.get_retry_tile_size(img.shape[:2], memory_limit)
+    assert memory.get_tile_size(img.shape[:2], memory_limit) is None
+    assert retry_tile_size < max(img.shape[:2])
+
+    # Images larger than the retry tiles run out of memory
+    cast_rays = swt.cast_rays
+
+    def limited_cast_rays(gx, *args):
+        if max(gx.shape) > retry_tile_size:
+            raise MemoryError
+        return cast_rays(gx, *args)
+
+    monkeypatch.setattr(swt, "cast_rays", limited_cast_rays)
+    report = MemoryReport()
+    tiled = Detector(DetectorConfig(memory_limit=memory_limit)).detect_boxes(img, report=report)
+    assert report.tiles > 1 and report.tile_size == retry_tile_size
+    assert len(tiled) > 0
+
+    # With a limit this high the retry tiles would cover the whole image, so the error is raised
+    memory_limit = memory.estimate_peak_bytes((1000, 1000))
+    assert memory.get_retry_tile_size(img.shape[:2], memory_limit) is None
+    with pytest.raises(MemoryError):
+        Detector(DetectorConfig(memory_limit=memory_limit)).detect_boxes(img)
+
+
+def make_chain(row_min, col_min, row_max, col_max):
+    chain = Chain()
+    chain.row_min, chain.col_min, chain.row_max, chain.col_max = row_min, col_min, row_max, col_max
+    return chain
+
+
+def test_merge_tile_chains():
+    inner = make_chain(10, 10, 20, 20)
+    outer = make_chain(5, 5, 25, 40)
+    copy_0 = make_chain(50, 50, 60, 80)
+    copy_1 = make_chain(50, 50, 60, 80)
+    nested = make_chain(12, 12, 18, 18)
+
+    merged = detector.merge_tile_chains([[inner, copy_0, nested], [outer, copy_1]])
+    # Chains inside a chain of another tile are dropped, one of two identical chains is kept
+    assert merged == [copy_0, outer]
@@ -0,0 +1,44 @@
+import csv
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import pyswt
+from pyswt import output
+
+
+@pytest.mark.parametrize("ext", [".jsonl", ".csv"])
+def test_box_writer(bgr_text_image, ext, tmp_path, get_dense_boxes):
+    chains_light_dark = pyswt.detect(bgr_text_image)
+    path = str(tmp_path / ("boxes" + ext))
+    with output.BoxWriter(path) as writer:
+        writer.write("first", chains_light_dark)
+        writer.write("second", chains_light_dark)
+
+    with open(path, newline="") as f:
+        if ext == ".csv":
+            records = [{k: v if k in ["image", "polarity"] else int(v) for k, v in record.items()}
+                       for record in csv.DictReader(f)]
+        else:
+            records = [json.loads(line) for line in f]
+
+    expected = [[record["row_min"], record["col_min"], record["row_max"], record["col_max"],
+                 1 if record["polarity"] == "light" else -1] for record in records if record["image"] == "first"]
+    np.testing.assert_array_equal(expected, get_dense_boxes(bgr_text_image))
+    assert [record["image"] for record in records] == ["first"] * len(expected) + ["second"] * len(expected)
+
+
+def test_overlay_writer_matches_run(bgr_text_image, tmp_path):
+    expected = pyswt.run(bgr_text_image)[0]
+    with output.OverlayWriter(str(tmp_path)) as writer:
+        writer.write("overlay", bgr_text_image, pyswt.detect(bgr_text_image), copy=True)
+    np.testing.assert_array_equal(cv2.imread(str(tmp_path / "overlay.png")), expected)
+
+
+def test_overlay_writer_raises_errors(bgr_text_image, tmp_path):
+    writer = output.OverlayWriter(str(tmp_path), ext=".no-such-format")
+    writer.write("overlay", bgr_text_image, pyswt.detect(bgr_text_image), copy=True)
+    with pytest.raises(Exception):
+        writer.close()
@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+
+import pyswt
+from pyswt import Detector, DetectorConfig
+from pyswt import prefilter
+from pyswt import swt
+from pyswt.memory import MemoryReport
+
+
+def test_prefilter_keeps_text(bgr_text_image, sort_boxes, get_dense_boxes):
+    # Text in one corner of an otherwise blank image
+    img = np.full((360, 480, 3), 40, np.uint8)
+    img[:120, :160] = bgr_text_image
+    mask = prefilter.run(img).get_mask()
+    assert mask.shape == img.shape[:2]
+    assert mask[:120, :160].all()
+    assert prefilter.run(img).get_skipped_fraction() > 0.5
+
+    expected = get_dense_boxes(img)
+    assert len(expected) > 0
+    assert sort_boxes(pyswt.detect_boxes(img, mask)) == sort_boxes(expected)
+    assert sort_boxes(get_dense_boxes(img, mask)) == sort_boxes(expected)
+
+
+def test_text_mask_limits_ray_origins(text_image, gradient_direction):
+    full = np.ones(text_image.shape, bool)
+    np.testing.assert_array_equal(swt.run(text_image, gradient_direction, full), swt.run(text_image, gradient_direction))
+    assert not swt.run(text_image, gradient_direction, ~full).any()
+
+
+def test_prefilter_config_skips_work(bgr_text_image, sort_boxes, monkeypatch):
+    # Text in one corner, and stripes with a single edge orientation the prefilter rejects
+    img = np.full((360, 480, 3), 40, np.uint8)
+    img[:120, :160] = bgr_text_image
+    img[200:, 200:][np.arange(160) // 4 % 2 == 0] = 200
+
+    reports = [MemoryReport(), MemoryReport()]
+    expected = Detector().detect_boxes(img, report=reports[0])
+
+    calls = []
+    get_edges_and_gradients = swt.get_edges_and_gradients
+
+    def recording_get_edges_and_gradients(*args):
+        calls.append(args)
+        return get_edges_and_gradients(*args)
+
+    monkeypatch.setattr(swt, "get_edges_and_gradients", recording_get_edges_and_gradients)
+    boxes = Detector(DetectorConfig(prefilter=True)).detect_boxes(img, report=reports[1])
+    assert sort_boxes(boxes) == sort_boxes(expected)
+
+    # The prefilter reuses the detector's gradients, and the rays in the stripes are never cast
+    assert len(calls) == 1
+    plain, filtered = (report.counts for report in reports)
+    assert filtered["rays"] < plain["rays"] / 4
+    assert filtered["ray_pixels"] < plain["ray_pixels"] / 2
+    assert filtered["component_pixels"] < plain["component_pixels"] / 2
+
+    # Rays end where they leave the passing tiles
+    mask = prefilter.run(img).get_mask()
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    for gradient_direction in [1, -1]:
+        assert not swt.run(gray, gradient_direction, mask)[~mask].any()
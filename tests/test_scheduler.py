@@ -0,0 +1,176 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from pyswt import scheduler as scheduler_module
+from pyswt.scheduler import StreamScheduler
+
+
+def full_frame_box(frame):
+    return np.array([[0, 0, frame.shape[0] - 1, frame.shape[1] - 1, 1]], np.int64)
+
+
+def paced_source(frame, count=None, interval=0.01, error=None):
+    """Source returning count frames at a steady rate, then ending or raising error"""
+    read = [0]
+
+    def read_frame():
+        if count is not None and read[0] == count:
+            if error is not None:
+                raise error
+            return None
+        time.sleep(interval)
+        read[0] += 1
+        return frame
+    return read_frame
+
+
+def wait_finished(scheduler, timeout=10):
+    thread = threading.Thread(target=scheduler.wait, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "scheduler.wait() did not return"
+
+
+def test_failing_source_ends_its_stream(bgr_text_image):
+    results = []
+    with StreamScheduler(workers=2, detect_func=full_frame_box,
+                         on_result=lambda name, index, boxes: results.append(name)) as scheduler:
+        scheduler.add_stream("failing", paced_source(bgr_text_image, 2, error=IOError("camera unplugged")))
+        scheduler.add_stream("healthy", paced_source(bgr_text_image, 3))
+        wait_finished(scheduler)
+        stats = scheduler.get_stats()
+
+    assert stats["failing"]["ended"] and isinstance(stats["failing"]["error"], IOError)
+    assert stats["failing"]["frames_read"] == 2
+    assert stats["healthy"]["ended"] and stats["healthy"]["error"] is None
+    assert results.count("healthy") == stats["healthy"]["frames_processed"] > 0
+
+
+def test_worker_errors_are_kept(bgr_text_image):
+    def failing_detect(frame):
+        raise ValueError("detection failed")
+
+    with StreamScheduler(workers=1, detect_func=failing_detect) as scheduler:
+        scheduler.add_stream("stream", paced_source(bgr_text_image, 3))
+        wait_finished(scheduler)
+        stats = scheduler.get_stats()["stream"]
+
+    assert isinstance(stats["error"], ValueError)
+    assert stats["frames_processed"] + stats["frames_dropped"] == 3
+
+
+class FakeClock:
+    """Stands in for the time module of the scheduler, only detections move it on"""
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_priorities_and_target_fps(bgr_text_image, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module, "time", clock)
+    frames = {name: bgr_text_image.copy() for name in ["high", "low", "paced"]}
+    names = {id(frame): name for name, frame in frames.items()}
+    taken = {name: threading.Event() for name in frames}
+    order = []
+    paced_starts = []
+
+    def source(name):
+        # The next frame is read as soon as the previous one is taken, so every stream always has one waiting
+        def read_frame():
+            taken[name].wait()
+            taken[name].clear()
+            return frames[name]
+        return read_frame
+
+    def detect(frame):
+        name = names[id(frame)]
+        taken[name].set()
+        order.append(name)
+        if name == "paced":
+            paced_starts.append(clock.now)
+        # Every detection takes 10 ms on the scheduler's clock, the real sleep lets the source read
+        time.sleep(0.01)
+        clock.now += 0.01
+        return full_frame_box(frame)
+
+    for event in taken.values():
+        event.set()
+    with StreamScheduler(workers=1, detect_func=detect) as scheduler:
+        scheduler.add_stream("high", source("high"), priority=2)
+        scheduler.add_stream("low", source("low"), priority=1)
+        scheduler.add_stream("paced", source("paced"), target_fps=20, priority=4)
+        while len(order) < 90:
+            time.sleep(0.01)
+        # Ending the sources
+        frames = {name: None for name in frames}
+        for event in taken.values():
+            event.set()
+    order = order[:90]
+
+    # Contended streams get frames in proportion to their priority
+    assert abs(order.count("high") - 2 * order.count("low")) <= 2
+    # The paced stream gets a frame every 50 ms, as soon as it is due and no sooner
+    assert (np.diff(paced_starts) >= 0.05 - 1e-9).all()
+    paced = [i for i, name in enumerate(order) if name == "paced"]
+    assert len(paced) >= 14
+    assert set(np.diff(paced)) <= {5, 6}
+
+
+def test_process_pool_rejected():
+    with ProcessPoolExecutor(1) as executor:
+        with pytest.raises(ValueError):
+            StreamScheduler(executor=executor)
+
+
+def test_adaptive_scale(bgr_text_image):
+    shapes = []
+
+    def detect(frame):
+        shapes.append(frame.shape)
+        # Full size frames miss the latency budget, downscaled frames meet it easily
+        if frame.shape == bgr_text_image.shape:
+            time.sleep(0.1)
+        return full_frame_box(frame)
+
+    results = []
+    with StreamScheduler(workers=1, detect_func=detect,
+                         on_result=lambda name, index, boxes: results.append(boxes)) as scheduler:
+        scheduler.add_stream("stream", paced_source(bgr_text_image, 10), latency_budget=0.05, scales=(1, 2))
+        wait_finished(scheduler)
+
+    assert shapes[0] == bgr_text_image.shape
+    assert (60, 80, 3) in shapes
+    # Boxes of downscaled frames are scaled back to the original frame
+    for shape, boxes in zip(shapes, results):
+        scale = bgr_text_image.shape[0] / shape[0]
+        np.testing.assert_array_equal(boxes, [[0, 0, (shape[0] - 1) * scale, (shape[1] - 1) * scale, 1]])
+
+
+def test_stop_waits_for_workers(bgr_text_image):
+    results = []
+
+    def slow_detect(frame):
+        time.sleep(0.05)
+        return full_frame_box(frame)
+
+    scheduler = StreamScheduler(workers=2, detect_func=slow_detect,
+                                on_result=lambda name, index, boxes: results.append(index))
+    with scheduler:
+        # Endless streams
+        scheduler.add_stream("first", paced_source(bgr_text_image))
+        scheduler.add_stream("second", paced_source(bgr_text_image), target_fps=50)
+        time.sleep(0.3)
+
+    # Nothing runs once stop() has returned
+    processed = len(results)
+    time.sleep(0.2)
+    assert len(results) == processed > 0
+    assert sum(stats["frames_processed"] for stats in scheduler.get_stats().values()) == processed
+    assert not any(thread.name.startswith("pyswt-") for thread in threading.enumerate())